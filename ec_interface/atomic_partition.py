@@ -0,0 +1,295 @@
+import numpy
+from numpy.typing import NDArray
+
+from typing import Dict, Iterator, Optional, Tuple
+
+from ec_interface.cell_list import CellList
+from ec_interface.vasp_geometry import Geometry
+from ec_interface.vasp_results import VaspResultGrid
+
+# number of grid points along each axis of a box
+BOX_SIZE = 4
+
+# number of boxes along each axis of a coarse box
+COARSE_FACTOR = 4
+
+# number of points (or pairs) handled at once
+BLOCK_SIZE = 2 ** 16
+
+
+class AtomicPartition:
+    """Partition of a grid between the atoms of a geometry: each grid point is assigned to its nearest atom (with
+    periodic boundaries), i.e., a Voronoi partition.
+    If `radii` (in Å) are given for some ion types (others have a radius of 0), the partition is weighted, so that
+    a point belongs to the atom that minimizes `d² - r²` (radical Voronoi partition, whose boundaries are planes).
+    The partition is computed once, and can be used to integrate any grid of the same size and geometry.
+    """
+
+    def __init__(self, geometry: Geometry, grid_size: Tuple[int, int, int], radii: Optional[Dict[str, float]] = None):
+        if len(geometry) == 0:
+            raise ValueError('geometry does not contain any atom')
+
+        self.geometry = geometry
+        self.grid_size = tuple(grid_size)
+
+        radii = {} if radii is None else radii
+        self.radii = numpy.array([radii.get(ion_type, .0) for ion_type in geometry.ion_types])[geometry.species]
+
+        self.labels = self._assign()
+
+    def _box(self, num_points: NDArray) -> Tuple[NDArray, float]:
+        """Get the center (relative to its first point) and the half-diagonal of a box of `num_points` grid points
+        along each axis
+        """
+
+        corners = numpy.stack(numpy.meshgrid(*(
+            [0, (n - 1) / g] for n, g in zip(num_points, self.grid_size)
+        ), indexing='ij'), axis=-1).reshape(-1, 3) @ self.geometry.lattice_vectors
+
+        center = corners.mean(axis=0)
+        return center, numpy.linalg.norm(corners - center, axis=1).max()
+
+    def _corners(self, num_boxes: NDArray, box_size: NDArray) -> NDArray:
+        """Get the position of the first point of each of the `num_boxes` boxes of `box_size` grid points
+        (in the same order as `numpy.ravel_multi_index()`)
+        """
+
+        return numpy.stack(numpy.meshgrid(*(
+            numpy.arange(n) * b / g for n, b, g in zip(num_boxes, box_size, self.grid_size)
+        ), indexing='ij'), axis=-1).reshape(-1, 3) @ self.geometry.lattice_vectors
+
+    def _cutoffs(self, half_diagonal: float) -> Iterator[float]:
+        """Get increasingly larger cutoffs, starting from one for which a few atoms are expected within the cutoff
+        (on average), until a cutoff for which the candidates of any box of `half_diagonal` are known for sure
+        """
+
+        lattice_vectors = self.geometry.lattice_vectors
+        volume = abs(numpy.linalg.det(lattice_vectors))
+
+        # any point is within `diameter` of (an image of) any atom
+        diameter = numpy.linalg.norm(lattice_vectors, axis=1).sum()
+        max_cutoff = half_diagonal + numpy.sqrt((diameter + half_diagonal) ** 2 + (self.radii ** 2).max())
+
+        cutoff = 2 * (3 * volume / (4 * numpy.pi * len(self.geometry))) ** (1 / 3) + self.radii.max() \
+            + 2 * half_diagonal
+
+        while cutoff < max_cutoff:
+            yield cutoff
+            cutoff *= 1.5
+
+        yield max_cutoff
+
+    def _bounds(self, distances: NDArray, j: NDArray, half_diagonal: float) -> Tuple[NDArray, NDArray]:
+        """Get the lower and upper bounds of `d² - r²` for the points of a box, given the `distances` between its
+        center and (an image of) atoms `j`
+        """
+
+        radii_sq = self.radii[j] ** 2
+        return numpy.maximum(distances - half_diagonal, .0) ** 2 - radii_sq, (distances + half_diagonal) ** 2 - radii_sq
+
+    def _candidates(self, centers: NDArray, half_diagonal: float) -> Tuple[NDArray, NDArray, NDArray]:
+        """Find the atoms that might be the nearest one of a point of the boxes of center `centers` (and which contain
+        points that are at most `half_diagonal` away from it), using a cell list. Cutoffs are only increased for the
+        boxes for which this is not known yet (e.g., in the vacuum).
+        Returns the box, the atom, and the position of its image.
+        """
+
+        positions = self.geometry.cartesian_coordinates()
+        max_radius_sq = (self.radii ** 2).max()
+
+        results_i, results_j, results_p = [], [], []
+        remaining = numpy.arange(centers.shape[0])
+
+        for cutoff in self._cutoffs(half_diagonal):
+            cell_list = CellList(self.geometry.lattice_vectors, positions, cutoff)
+
+            for block_start in range(0, len(remaining), BLOCK_SIZE):
+                boxes = remaining[block_start:block_start + BLOCK_SIZE]
+                i, j, vectors = cell_list.query_vectors(centers[boxes])
+
+                lower, upper = self._bounds(numpy.linalg.norm(vectors, axis=1), j, half_diagonal)
+                best_upper = numpy.full(len(boxes), numpy.inf)
+                numpy.minimum.at(best_upper, i, upper)
+
+                # an atom outside of the cutoff has a lower bound of at least `(cutoff - h)² - max(r)²`, so the
+                # candidates are only known for sure if the best upper bound is below that (always true for the last
+                # cutoff)
+                resolved = best_upper <= (cutoff - half_diagonal) ** 2 - max_radius_sq
+                keep = resolved[i] & (lower <= best_upper[i])
+
+                results_i.append(boxes[i[keep]])
+                results_j.append(j[keep])
+                results_p.append(centers[boxes[i[keep]]] + vectors[keep])
+
+                remaining[block_start:block_start + len(boxes)] = numpy.where(resolved, -1, boxes)
+
+            remaining = remaining[remaining >= 0]
+            if len(remaining) == 0:
+                break
+
+        return numpy.concatenate(results_i), numpy.concatenate(results_j), numpy.concatenate(results_p)
+
+    def _refine(
+        self,
+        coarse_candidates: Tuple[NDArray, NDArray, NDArray],
+        num_coarse_boxes: NDArray,
+        factor: NDArray,
+        box_size: NDArray
+    ) -> Tuple[NDArray, NDArray, NDArray]:
+        """Get the candidates of the boxes of `box_size` grid points, from the ones of the coarse boxes that contain
+        them (`factor` boxes along each axis). Indeed, an atom that cannot be the nearest one of any point of a coarse
+        box cannot be the one of a point of a smaller box that it contains.
+        Returns the box, the atom, and the position of its image (as `_candidates()`).
+        """
+
+        coarse_i, j, candidate_positions = coarse_candidates
+        order = numpy.argsort(coarse_i, kind='stable')
+        coarse_i, j, candidate_positions = coarse_i[order], j[order], candidate_positions[order]
+
+        num_coarse = numpy.prod(num_coarse_boxes)
+        coarse_corners = self._corners(num_coarse_boxes, box_size * factor)
+
+        center, half_diagonal = self._box(box_size)
+        children_centers = self._corners(factor, box_size) + center
+        num_children = children_centers.shape[0]
+
+        # index of each box of each coarse box
+        coarse_multi_index = numpy.array(numpy.unravel_index(numpy.arange(num_coarse), num_coarse_boxes))
+        child_multi_index = numpy.array(numpy.unravel_index(numpy.arange(num_children), factor))
+        children_multi_index = \
+            coarse_multi_index[:, :, numpy.newaxis] * factor[:, numpy.newaxis, numpy.newaxis] + \
+            child_multi_index[:, numpy.newaxis, :]
+        children = numpy.ravel_multi_index(tuple(children_multi_index), num_coarse_boxes * factor)
+
+        counts = numpy.bincount(coarse_i, minlength=num_coarse)
+        ends = numpy.cumsum(counts)
+        num_coarse_per_block = max(1, BLOCK_SIZE // (num_children * max(1, counts.max())))
+
+        results_i, results_j, results_p = [], [], []
+
+        for coarse_start in range(0, num_coarse, num_coarse_per_block):
+            coarse_stop = min(coarse_start + num_coarse_per_block, num_coarse)
+            pairs = slice(ends[coarse_start] - counts[coarse_start], ends[coarse_stop - 1])
+
+            block_i, block_j, block_positions = coarse_i[pairs], j[pairs], candidate_positions[pairs]
+
+            # bounds for each (candidate, box) pair
+            distances = numpy.linalg.norm(
+                block_positions[:, numpy.newaxis, :] - coarse_corners[block_i, numpy.newaxis, :] - children_centers,
+                axis=2
+            )
+
+            lower, upper = self._bounds(distances, block_j[:, numpy.newaxis], half_diagonal)
+
+            boxes = children[block_i]
+            best_upper = numpy.full(numpy.prod(num_coarse_boxes * factor), numpy.inf)
+            numpy.minimum.at(best_upper, boxes, upper)
+
+            keep = lower <= best_upper[boxes]
+            pair_index = numpy.nonzero(keep)[0]
+
+            results_i.append(boxes[keep])
+            results_j.append(block_j[pair_index])
+            results_p.append(block_positions[pair_index])
+
+        return numpy.concatenate(results_i), numpy.concatenate(results_j), numpy.concatenate(results_p)
+
+    def _assign(self) -> NDArray:
+        """Assign each grid point to an atom.
+        The grid is divided in small boxes, for which a few candidates are found (first for coarse boxes, with a cell
+        list, then refined). Then, the points of each box are assigned to its best candidate, for many boxes at once.
+        """
+
+        grid_size = numpy.array(self.grid_size)
+        lattice_vectors = self.geometry.lattice_vectors
+
+        box_size = numpy.minimum(BOX_SIZE, grid_size)
+        factor = numpy.minimum(COARSE_FACTOR, -(-grid_size // box_size))
+        num_coarse_boxes = -(-grid_size // (box_size * factor))
+
+        # candidates of the coarse boxes, then of the boxes (sorted by box)
+        center, half_diagonal = self._box(box_size * factor)
+        coarse_candidates = self._candidates(
+            self._corners(num_coarse_boxes, box_size * factor) + center, half_diagonal)
+
+        i, j, candidate_positions = self._refine(coarse_candidates, num_coarse_boxes, factor, box_size)
+        order = numpy.argsort(i, kind='stable')
+        i, j, candidate_positions = i[order], j[order], candidate_positions[order]
+
+        # boxes (those on the boundaries might contain points that are outside of the grid), and points within a box
+        num_boxes = num_coarse_boxes * factor
+        corners = self._corners(num_boxes, box_size)
+
+        offsets = numpy.stack(numpy.meshgrid(*(
+            numpy.arange(b) / g for b, g in zip(box_size, grid_size)
+        ), indexing='ij'), axis=-1).reshape(-1, 3) @ lattice_vectors
+
+        counts = numpy.bincount(i, minlength=corners.shape[0])
+        starts = numpy.cumsum(counts) - counts
+        within = numpy.arange(len(i)) - starts[i]
+
+        # `argmin(|p - a|² - r²) = argmin(|a|² - r² - 2 p·a)`, computed for many boxes at once
+        weights = numpy.einsum('ij,ij->i', candidate_positions, candidate_positions) - self.radii[j] ** 2
+
+        labels = numpy.empty((corners.shape[0], offsets.shape[0]), dtype=numpy.int32)
+        num_boxes_per_block = max(1, BLOCK_SIZE // offsets.shape[0])
+
+        for box_start in range(0, corners.shape[0], num_boxes_per_block):
+            box_stop = min(box_start + num_boxes_per_block, corners.shape[0])
+            num_candidates = counts[box_start:box_stop].max()
+
+            block_positions = numpy.zeros((box_stop - box_start, num_candidates, 3))
+            block_weights = numpy.full((box_stop - box_start, num_candidates), numpy.inf)
+            block_atoms = numpy.zeros((box_stop - box_start, num_candidates), dtype=numpy.int32)
+
+            pairs = slice(starts[box_start], starts[box_stop - 1] + counts[box_stop - 1])
+            index = (i[pairs] - box_start, within[pairs])
+            block_positions[index] = candidate_positions[pairs]
+            block_weights[index] = weights[pairs]
+            block_atoms[index] = j[pairs]
+
+            points = corners[box_start:box_stop, numpy.newaxis, :] + offsets
+            scores = block_weights[:, numpy.newaxis, :] - 2 * points @ block_positions.transpose(0, 2, 1)
+
+            labels[box_start:box_stop] = numpy.take_along_axis(block_atoms, scores.argmin(axis=2), axis=1)
+
+        # back to the grid
+        labels = labels.reshape((*num_boxes, *box_size)).transpose(0, 3, 1, 4, 2, 5).reshape(num_boxes * box_size)
+
+        return numpy.ascontiguousarray(labels[:grid_size[0], :grid_size[1], :grid_size[2]])
+
+    def matches(self, grid: VaspResultGrid, tolerance: float = 1e-4) -> bool:
+        """Check whether the partition can be used for `grid`, i.e., that the grid size and the geometry are the same
+        """
+
+        return grid.grid_data.shape == self.grid_size \
+            and grid.geometry.ion_types == self.geometry.ion_types \
+            and grid.geometry.ion_numbers == self.geometry.ion_numbers \
+            and numpy.allclose(grid.geometry.lattice_vectors, self.geometry.lattice_vectors, atol=tolerance) \
+            and numpy.allclose(
+                grid.geometry.cartesian_coordinates(), self.geometry.cartesian_coordinates(), atol=tolerance)
+
+    def integrate(self, grid: VaspResultGrid) -> NDArray:
+        """Integrate `grid` (e.g., a `CHGCAR`, in which values are multiplied by the volume) over the region of each
+        atom. Returns one value per atom (e.g., the number of electrons).
+        """
+
+        if grid.grid_data.shape != self.grid_size:
+            raise ValueError('grid size {} does not match the one of the partition ({})'.format(
+                grid.grid_data.shape, self.grid_size))
+
+        return numpy.bincount(
+            self.labels.ravel(), weights=grid.grid_data.ravel(), minlength=len(self.geometry)
+        ) / self.labels.size
+
+    def per_species(self, charges: NDArray) -> NDArray:
+        """Sum `charges` (one per atom) per ion type
+        """
+
+        return numpy.bincount(self.geometry.species, weights=charges, minlength=len(self.geometry.ion_types))
+
+    def per_layer(self, charges: NDArray, tolerance: float = .5) -> NDArray:
+        """Sum `charges` (one per atom) per layer (see `Geometry.layers()`), from the bottom to the top of the slab
+        """
+
+        return numpy.bincount(self.geometry.layers(tolerance), weights=charges)
@@ -0,0 +1,109 @@
+import itertools
+
+import numpy
+from numpy.typing import NDArray
+
+from typing import Optional, Tuple
+
+
+class CellList:
+    """Periodic cell list, i.e., points of a periodic cell sorted into bins which are at least `cutoff` wide,
+    so that all the pairs of points within `cutoff` are found in (roughly) O(n) by only looking at neighbouring bins.
+    """
+
+    def __init__(self, lattice_vectors: NDArray, positions: NDArray, cutoff: float):
+        assert cutoff > 0
+
+        self.lattice_vectors = lattice_vectors
+        self.cutoff = cutoff
+
+        # number of bins along each lattice vector, so that bins are at least `cutoff` wide
+        volume = numpy.abs(numpy.linalg.det(lattice_vectors))
+        widths = volume / numpy.linalg.norm(numpy.cross(
+            numpy.roll(lattice_vectors, -1, axis=0), numpy.roll(lattice_vectors, -2, axis=0)), axis=1)
+
+        self.num_bins = numpy.maximum(1, numpy.floor(widths / cutoff)).astype(int)
+
+        # number of neighbouring bins to explore (more than 1 if the cell is smaller than `cutoff`)
+        self._reach = numpy.maximum(1, numpy.ceil(cutoff * self.num_bins / widths - 1e-8)).astype(int)
+
+        # put points in the cell, and sort them by bin
+        self._positions, bins = self._wrap(positions)
+        bin_ids = numpy.ravel_multi_index(bins.T, self.num_bins)
+
+        self._order = numpy.argsort(bin_ids, kind='stable')
+        self._counts = numpy.bincount(bin_ids, minlength=numpy.prod(self.num_bins))
+        self._starts = numpy.cumsum(self._counts) - self._counts
+
+    def __len__(self) -> int:
+        return self._positions.shape[0]
+
+    def _wrap(self, positions: NDArray) -> Tuple[NDArray, NDArray]:
+        """Wrap (cartesian) `positions` in the cell, and get their bins
+        """
+
+        direct = numpy.linalg.solve(self.lattice_vectors.T, positions.T).T
+        direct -= numpy.floor(direct)
+
+        bins = numpy.minimum(numpy.floor(direct * self.num_bins).astype(int), self.num_bins - 1)
+
+        return direct @ self.lattice_vectors, bins
+
+    def query_vectors(self, points: NDArray, cutoff: Optional[float] = None) -> Tuple[NDArray, NDArray, NDArray]:
+        """Find all pairs `(i, j)` such that (a periodic image of) point `j` of the list is within `cutoff` (which
+        cannot be larger than the one of the list) of `points[i]`.
+        Returns `i`, `j`, and the corresponding vectors (from `points[i]` to the image of point `j`).
+        """
+
+        cutoff = self.cutoff if cutoff is None else cutoff
+        if cutoff > self.cutoff:
+            raise ValueError('cutoff ({}) is larger than the one of the list ({})'.format(cutoff, self.cutoff))
+
+        # (vectors do not depend on which image of `points[i]` is used)
+        points, bins = self._wrap(points)
+
+        results_i, results_j = [numpy.zeros(0, dtype=int)], [numpy.zeros(0, dtype=int)]
+        results_v = [numpy.zeros((0, 3))]
+
+        for offset in itertools.product(*(range(-r, r + 1) for r in self._reach)):
+            # neighbouring bin, and the image it belongs to
+            neighbours = bins + offset
+            images = numpy.floor_divide(neighbours, self.num_bins)
+            neighbour_ids = numpy.ravel_multi_index((neighbours - images * self.num_bins).T, self.num_bins)
+
+            # all pairs between the points and the content of their neighbouring bin
+            counts = self._counts[neighbour_ids]
+            total = counts.sum()
+            if total == 0:
+                continue
+
+            i = numpy.repeat(numpy.arange(points.shape[0]), counts)
+            within = numpy.arange(total) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+            j = self._order[numpy.repeat(self._starts[neighbour_ids], counts) + within]
+
+            v = self._positions[j] + (images @ self.lattice_vectors)[i] - points[i]
+            mask = numpy.einsum('ij,ij->i', v, v) <= cutoff ** 2
+
+            results_i.append(i[mask])
+            results_j.append(j[mask])
+            results_v.append(v[mask])
+
+        return numpy.concatenate(results_i), numpy.concatenate(results_j), numpy.concatenate(results_v)
+
+    def query(self, points: NDArray, cutoff: Optional[float] = None) -> Tuple[NDArray, NDArray, NDArray]:
+        """Same as `query_vectors()`, but returns the distances instead of the vectors
+        """
+
+        i, j, v = self.query_vectors(points, cutoff)
+        return i, j, numpy.linalg.norm(v, axis=1)
+
+    def pairs(self, cutoff: Optional[float] = None) -> Tuple[NDArray, NDArray, NDArray]:
+        """Find all pairs `(i, j)`, with `i < j`, of points of the list that are within `cutoff` of each other
+        (a pair appears more than once if more than one periodic image is within `cutoff`).
+        Returns `i`, `j`, and the corresponding distances.
+        """
+
+        i, j, d = self.query(self._positions, cutoff)
+        mask = i < j
+
+        return i[mask], j[mask], d[mask]
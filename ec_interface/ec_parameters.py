@@ -1,5 +1,5 @@
 import pathlib
-from typing import TextIO, Iterator, List, Optional as TOpt
+from typing import TextIO, Iterator, List, Tuple, Optional as TOpt
 
 import schema
 from schema import Schema, And, Optional, Or
@@ -66,12 +66,36 @@ class ECParameters:
         # yield remaining additional, if any
         yield from self.additional[j:]
 
+    def chain(self) -> Iterator[Tuple[float, TOpt[float]]]:
+        """Give the number of electrons for each step, ordered outward from `ne_zc`, together with the number of
+        electrons of the (neighbouring) step it can start from (`None` for the one which is the closest to `ne_zc`)
+        """
+
+        steps = list(self.steps())
+        if len(steps) == 0:
+            return
+
+        root = min(range(len(steps)), key=lambda i: abs(steps[i] - self.ne_zc))
+        yield steps[root], None
+
+        for k in range(1, max(root + 1, len(steps) - root)):
+            if root + k < len(steps):
+                yield steps[root + k], steps[root + k - 1]
+            if root - k >= 0:
+                yield steps[root - k], steps[root - k + 1]
+
+    def directory(self, parent: pathlib.Path, n: float) -> pathlib.Path:
+        """Give the directory were the calculation with `n` electrons is performed
+        """
+
+        return parent / '{}_{:.3f}'.format(self.prefix, n)
+
     def directories(self, parent: pathlib.Path) -> Iterator[pathlib.Path]:
         """Yield the directories were the calculation are performed
         """
 
         for n in self.steps():
-            yield parent / '{}_{:.3f}'.format(self.prefix, n)
+            yield self.directory(parent, n)
 
     def __str__(self):
         return 'NELECT = {{{r}:{n}:{s}}} & {{{n}:{a}:{s}}}{adds}'.format(
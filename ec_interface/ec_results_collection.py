@@ -0,0 +1,205 @@
+import numpy
+import pathlib
+import h5py
+
+from typing import Dict, List
+from numpy.typing import NDArray
+
+from ec_interface.ec_results import ECResults, ZC_TOLERANCE
+
+
+class ECResultsCollection:
+    """Results of many EC calculations (one per system), packed in padded arrays of shape `(nsystems, npoints)`,
+    so that analysis is performed for all systems at once.
+    Each system is sorted by increasing number of electrons, and `mask` is `False` for padding, which is set to NaN.
+    """
+
+    def __init__(self, names: List[str], ne_zcs: NDArray, data: NDArray, mask: NDArray):
+        assert data.shape[2] == 5
+        assert data.shape[:2] == mask.shape
+        assert len(names) == len(ne_zcs) == data.shape[0]
+
+        self.names = names
+        self.ne_zcs = ne_zcs
+        self.data = data
+        self.mask = mask
+
+        self.nelects = data[:, :, 0]
+        self.free_energies = data[:, :, 1]
+        self.fermi_energies = data[:, :, 2]
+        self.vacuum_potentials = data[:, :, 3]
+        self.average_potentials = data[:, :, 4]
+
+    @classmethod
+    def from_results(cls, results: Dict[str, ECResults]) -> 'ECResultsCollection':
+        """Pack a set of results
+        """
+
+        names = list(results.keys())
+        npoints = max((len(r) for r in results.values()), default=0)
+
+        data = numpy.full((len(names), npoints, 5), numpy.nan)
+        mask = numpy.zeros((len(names), npoints), dtype=bool)
+        ne_zcs = numpy.zeros(len(names))
+
+        for i, name in enumerate(names):
+            r = results[name]
+            data[i, :len(r)] = r.data  # already sorted
+            mask[i, :len(r)] = True
+            ne_zcs[i] = r.ne_zc
+
+        return cls(names, ne_zcs, data, mask)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, name: str) -> ECResults:
+        i = self.names.index(name)
+        return ECResults(self.ne_zcs[i], self.data[i, self.mask[i]])
+
+    def to_hdf5(self, path: pathlib.Path):
+        """Save data in a HDF5 file, one group per system
+        """
+
+        with h5py.File(path, 'w') as f:
+            for i, name in enumerate(self.names):
+                dset = f.create_group(name).create_dataset('ec_results', data=self.data[i, self.mask[i]])
+                dset.attrs['version'] = 1
+                dset.attrs['ne_zc'] = self.ne_zcs[i]
+
+    @classmethod
+    def from_hdf5(cls, path: pathlib.Path) -> 'ECResultsCollection':
+        """Load all the systems of a HDF5 file containing one group per system (see `to_hdf5()`)
+        """
+
+        results = {}
+
+        with h5py.File(path, 'r') as f:
+            for name, group in f.items():
+                if not isinstance(group, h5py.Group) or 'ec_results' not in group:
+                    raise Exception('invalid h5 file: no `{}/ec_results` dataset'.format(name))
+
+                dset = group['ec_results']
+                if 'version' not in dset.attrs or dset.attrs['version'] > 1:
+                    raise Exception('unknown version for dataset, use a more recent version of this package!')
+
+                if 'ne_zc' not in dset.attrs:
+                    raise Exception('invalid h5 file: no `ne_zc` for `{}`'.format(name))
+
+                results[name] = ECResults(dset.attrs['ne_zc'], dset[:])
+
+        return cls.from_results(results)
+
+    def work_functions(self) -> NDArray:
+        return self.vacuum_potentials - self.fermi_energies
+
+    def dnelects(self) -> NDArray:
+        return self.nelects - self.ne_zcs[:, numpy.newaxis]
+
+    def indices_zc(self, tolerance: float = ZC_TOLERANCE) -> NDArray:
+        """Get the index of the zero-charge point of each system
+        """
+
+        dnelect = numpy.where(self.mask, numpy.abs(self.dnelects()), numpy.inf)
+        indices = numpy.argmin(dnelect, axis=1)
+
+        missing = dnelect[numpy.arange(len(self)), indices] > tolerance
+        if numpy.any(missing):
+            raise Exception('no zero-charge point for {}'.format(', '.join(numpy.array(self.names)[missing])))
+
+        return indices
+
+    def _at_zc(self, values: NDArray) -> NDArray:
+        return values[numpy.arange(len(self)), self.indices_zc()]
+
+    def _shift_fee(self, shift_with_avg: bool) -> NDArray:
+        if shift_with_avg:
+            return self._at_zc(self.average_potentials)[:, numpy.newaxis]
+        else:
+            return numpy.zeros((len(self), 1))
+
+    def pzcs(self) -> NDArray:
+        """Get the potential of zero charge (i.e., the work function at zero charge) of each system
+        """
+
+        return self._at_zc(self.work_functions())
+
+    def compute_fee_hbm(
+            self, alphas: NDArray, shift_with_avg: bool = False, ref: float = 4.5
+    ) -> NDArray:
+        """Compute the FEE (see `ECResults.compute_fee_hbm()`) of each system, with `alphas` the vacuum fractions.
+        """
+
+        work_function = self.work_functions()
+        dnelect = self.dnelects()
+        alphas = numpy.broadcast_to(alphas, (len(self),))[:, numpy.newaxis]
+
+        fe0 = self._at_zc(self.free_energies)[:, numpy.newaxis]
+
+        # integrate vacuum potential from zero charge, using the cumulative trapezoidal rule (padding contributes 0)
+        segments = numpy.nan_to_num(
+            .5 * (self.vacuum_potentials[:, 1:] + self.vacuum_potentials[:, :-1]) * numpy.diff(dnelect, axis=1))
+        cumulative = numpy.hstack([numpy.zeros((len(self), 1)), numpy.cumsum(segments, axis=1)])
+        integ_average_pot = cumulative - self._at_zc(cumulative)[:, numpy.newaxis]
+
+        fee = fe0 + alphas * (self.free_energies - fe0 + dnelect * work_function - integ_average_pot)
+
+        return numpy.stack(
+            [dnelect, work_function, work_function - ref, fee - self._shift_fee(shift_with_avg)], axis=-1)
+
+    def compute_fee_hbm_fermi(self, shift_with_avg: bool = False, ref: float = 4.5) -> NDArray:
+        """Compute the FEE (see `ECResults.compute_fee_hbm_fermi()`) of each system
+        """
+
+        work_function = self.work_functions()
+        dnelect = self.dnelects()
+        fee = self.free_energies - dnelect * self.fermi_energies
+
+        return numpy.stack(
+            [dnelect, work_function, work_function - ref, fee - self._shift_fee(shift_with_avg)], axis=-1)
+
+    def compute_fee_pbm(self, shift_with_avg: bool = False, ref: float = 4.5) -> NDArray:
+        """Compute the FEE (see `ECResults.compute_fee_pbm()`) of each system
+        """
+
+        work_function = self.work_functions()
+        dnelect = self.dnelects()
+        fee = self.free_energies + dnelect * work_function
+
+        return numpy.stack(
+            [dnelect, work_function, work_function - ref, fee - self._shift_fee(shift_with_avg)], axis=-1)
+
+    def polyfit(self, x: NDArray, y: NDArray, order: int) -> NDArray:
+        """Least-square polynomial fit of `y` vs `x` (both of shape `(nsystems, npoints)`) for each system,
+        ignoring padding. Coefficients are given with the highest power first, as in `numpy.polyfit()`.
+        """
+
+        x = numpy.where(self.mask, x, .0)
+        y = numpy.where(self.mask, y, .0)
+
+        vander = x[:, :, numpy.newaxis] ** numpy.arange(order, -1, -1) * self.mask[:, :, numpy.newaxis]
+
+        # as in `numpy.polyfit()`, scale the columns and solve with an orthogonal factorization (padding rows are zero),
+        # rather than with the normal equations, of which the condition number is squared
+        scale = numpy.sqrt((vander ** 2).sum(axis=1))[:, numpy.newaxis, :]
+        q, r = numpy.linalg.qr(vander / scale)
+        coefficients = numpy.linalg.solve(r, numpy.einsum('snk,sn->sk', q, y)[:, :, numpy.newaxis])[:, :, 0]
+
+        return coefficients / scale[:, 0, :]
+
+    def capacitances(self, fee: NDArray) -> NDArray:
+        """Estimate the differential capacitance of each system out of a quadratic fit of the grand potential vs the
+        work function, with `fee` obtained from one of the `compute_fee_*()` methods.
+        """
+
+        return -2 * self.polyfit(fee[:, :, 1], fee[:, :, 3], 2)[:, 0]
+
+    def estimate_active_fractions(self, shift_with_avg: bool = False) -> NDArray:
+        """Estimate the active fraction of each system (see `ECResults.estimate_active_fraction()`).
+        """
+
+        work_function = self.work_functions()
+        cap_1 = -self.polyfit(work_function, self.dnelects(), 1)[:, 0]
+        cap_2 = self.capacitances(self.compute_fee_hbm_fermi(shift_with_avg=shift_with_avg))
+
+        return cap_2 / cap_1
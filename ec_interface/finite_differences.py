@@ -0,0 +1,76 @@
+import collections
+
+import numpy
+from numpy.typing import NDArray
+
+from typing import Iterable, Iterator, List, Tuple
+
+
+def fornberg_weights(x0: float, x: NDArray, order: int = 1) -> NDArray:
+    """Get the weights of the finite difference approximation of the `order`-th derivative at `x0`, using the
+    values at (possibly non-uniformly spaced) points `x` (see 10.1090/S0025-5718-1988-0935077-0).
+    """
+
+    n = len(x)
+    assert n > order
+
+    c = numpy.zeros((n, order + 1))
+    c[0, 0] = 1.
+
+    c1 = 1.
+    c4 = x[0] - x0
+
+    for i in range(1, n):
+        mn = min(i, order)
+        c2 = 1.
+        c5 = c4
+        c4 = x[i] - x0
+
+        for j in range(i):
+            c3 = x[i] - x[j]
+            c2 *= c3
+
+            if j == i - 1:
+                for k in range(mn, 0, -1):
+                    c[i, k] = c1 * (k * c[i - 1, k - 1] - c5 * c[i - 1, k]) / c2
+                c[i, 0] = -c1 * c5 * c[i - 1, 0] / c2
+
+            for k in range(mn, 0, -1):
+                c[j, k] = (c4 * c[j, k] - k * c[j, k - 1]) / c3
+            c[j, 0] = c4 * c[j, 0] / c3
+
+        c1 = c2
+
+    return c[:, order]
+
+
+def sliding_derivatives(
+    x: List[float], values: Iterable[NDArray], half_width: int = 1
+) -> Iterator[Tuple[int, NDArray]]:
+    """Compute the first derivative of `values` (given in the order of `x`) at each point of `x`, using
+    `2 * half_width + 1` consecutive points (central differences, except at the boundaries).
+    Values are only read once, and at most `2 * half_width + 1` of them are kept in memory.
+    Yields the index of the point and the derivative, in order.
+    """
+
+    n = len(x)
+    num_points = 2 * half_width + 1
+    if n < num_points:
+        raise ValueError('at least {} points are required, got {}'.format(num_points, n))
+
+    x = numpy.asarray(x, dtype=float)
+    window = collections.deque(maxlen=num_points)
+    i = 0
+
+    for j, value in enumerate(values):
+        window.append(value)
+
+        # compute the derivatives of which the stencil ends at `j`
+        while i < n:
+            start = min(max(i - half_width, 0), n - num_points)
+            if start + num_points - 1 != j:
+                break
+
+            weights = fornberg_weights(x[i], x[start:start + num_points])
+            yield i, sum(w * v for w, v in zip(weights, window))
+            i += 1
@@ -0,0 +1,82 @@
+import ast
+
+from numpy.typing import NDArray
+
+from typing import Dict, Iterable, Iterator, Tuple
+
+
+class ExpressionError(Exception):
+    pass
+
+
+def _linear_combination(node: ast.AST) -> Tuple[Dict[str, float], float]:
+    """Get the coefficient of each variable, and the constant term, of a node of the syntax tree
+    """
+
+    if isinstance(node, ast.Name):
+        return {node.id: 1.}, .0
+    elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return {}, float(node.value)
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        coefficients, constant = _linear_combination(node.operand)
+        factor = -1. if isinstance(node.op, ast.USub) else 1.
+        return dict((k, factor * v) for k, v in coefficients.items()), factor * constant
+    elif isinstance(node, ast.BinOp):
+        left_coefficients, left_constant = _linear_combination(node.left)
+        right_coefficients, right_constant = _linear_combination(node.right)
+
+        if isinstance(node.op, (ast.Add, ast.Sub)):
+            factor = -1. if isinstance(node.op, ast.Sub) else 1.
+            coefficients = left_coefficients.copy()
+            for k, v in right_coefficients.items():
+                coefficients[k] = coefficients.get(k, .0) + factor * v
+
+            return coefficients, left_constant + factor * right_constant
+
+        elif isinstance(node.op, ast.Mult):
+            if len(left_coefficients) > 0 and len(right_coefficients) > 0:
+                raise ExpressionError('expression is not linear (product of grids)')
+
+            if len(left_coefficients) == 0:
+                left_coefficients, left_constant, right_constant = right_coefficients, right_constant, left_constant
+
+            return dict((k, v * right_constant) for k, v in left_coefficients.items()), left_constant * right_constant
+
+        elif isinstance(node.op, ast.Div):
+            if len(right_coefficients) > 0:
+                raise ExpressionError('expression is not linear (division by a grid)')
+            if right_constant == 0:
+                raise ExpressionError('division by zero')
+
+            return dict((k, v / right_constant) for k, v in left_coefficients.items()), left_constant / right_constant
+
+    raise ExpressionError('unsupported element in expression: `{}`'.format(ast.unparse(node)))
+
+
+def parse_expression(expression: str) -> Tuple[Dict[str, float], float]:
+    """Parse a linear combination of grids (e.g., `a - b - c` or `(a - b) / 0.05`).
+    Returns the coefficient of each grid, and the constant term.
+    """
+
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError('invalid expression `{}`: {}'.format(expression, e.msg))
+
+    return _linear_combination(tree.body)
+
+
+def evaluate_blocks(
+    coefficients: Dict[str, float], constant: float, blocks: Dict[str, Iterable[NDArray]]
+) -> Iterator[NDArray]:
+    """Evaluate a linear combination block by block, with `blocks` giving the blocks of each grid, which are read
+    in lockstep (so that only one block per grid is in memory at a time).
+    """
+
+    names = list(coefficients.keys())
+    for values in zip(*(blocks[name] for name in names)):
+        result = constant + coefficients[names[0]] * values[0]
+        for name, value in zip(names[1:], values[1:]):
+            result += coefficients[name] * value
+
+        yield result
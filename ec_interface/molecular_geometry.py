@@ -1,5 +1,5 @@
 import numpy
-from typing import TextIO, List
+from typing import BinaryIO, Iterator, TextIO, List, Union
 from numpy.typing import NDArray
 
 from ec_interface import vasp_geometry
@@ -23,18 +23,22 @@ class MolecularGeometry:
         """Read geometry from a XYZ file
         """
 
-        symbols = []
-        positions = []
-
         n = int(f.readline())
         f.readline()
 
-        for i in range(n):
-            data = f.readline().split()
-            symbols.append(data[0])
-            positions.append([float(x) for x in data[1:]])
+        return cls.from_xyz_lines([f.readline() for _ in range(n)])
+
+    @classmethod
+    def from_xyz_lines(cls, lines: List[Union[str, bytes]]) -> 'MolecularGeometry':
+        """Create a geometry out of the lines of a XYZ file that contain the atoms, parsed in a single block
+        """
+
+        if len(lines) == 0:
+            return cls([], numpy.zeros((0, 3)))
+
+        data = numpy.loadtxt(lines, usecols=(0, 1, 2, 3), dtype=str, comments=None, ndmin=2)
 
-        return cls(symbols, numpy.array(positions))
+        return cls(data[:, 0].tolist(), data[:, 1:].astype(float))
 
     def as_xyz(self, title: str = '') -> str:
         """Get XYZ representation of this geometry"""
@@ -78,3 +82,65 @@ class MolecularGeometry:
             positions=positions,
             is_direct=False
         )
+
+
+class XYZTrajectory:
+    """A (possibly very large) XYZ file containing many frames, of which only the requested ones are read.
+    The byte offset of each frame is indexed when first needed, so that frames can be accessed without parsing the
+    previous ones.
+    """
+
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self._offsets = None
+
+    def _index(self) -> NDArray:
+        """Get the byte offset of each frame
+        """
+
+        if self._offsets is None:
+            offsets = []
+
+            self.f.seek(0)
+            while True:
+                offset = self.f.tell()
+                line = self.f.readline()
+                if line.strip() == b'':
+                    break
+
+                offsets.append(offset)
+
+                # skip the title and the atoms
+                for _ in range(int(line) + 1):
+                    self.f.readline()
+
+            self._offsets = numpy.array(offsets, dtype=numpy.int64)
+
+        return self._offsets
+
+    def __len__(self) -> int:
+        return len(self._index())
+
+    def __getitem__(self, i: int) -> MolecularGeometry:
+        return self._read(self._index()[i])
+
+    def _read(self, offset: int) -> MolecularGeometry:
+        self.f.seek(offset)
+
+        n = int(self.f.readline())
+        self.f.readline()
+
+        return MolecularGeometry.from_xyz_lines([self.f.readline() for _ in range(n)])
+
+    def frames(self, selection: slice = slice(None)) -> Iterator[MolecularGeometry]:
+        """Lazily yield the frames in `selection`, only one of them being in memory at a time
+        """
+
+        for offset in self._index()[selection]:
+            yield self._read(offset)
+
+    def indices(self, selection: slice = slice(None)) -> NDArray:
+        """Get the indices of the frames in `selection`
+        """
+
+        return numpy.arange(len(self))[selection]
@@ -0,0 +1,132 @@
+import hashlib
+import io
+import json
+import os
+import pathlib
+import shutil
+
+from typing import BinaryIO, Dict, List, NamedTuple, Optional
+
+from ec_interface.vasp_geometry import Geometry, get_zvals
+
+INDEX_VERSION = 1
+
+
+def default_cache_directory() -> pathlib.Path:
+    """Get the directory in which indexes are stored (following the XDG specification)
+    """
+
+    return pathlib.Path(os.environ.get('XDG_CACHE_HOME', pathlib.Path.home() / '.cache')) / 'ec_interface'
+
+
+class PotcarEntry(NamedTuple):
+    """Entry of the index, for one pseudopotential
+    """
+
+    path: str
+    zval: float
+    size: int
+    mtime: float
+    checksum: str
+
+
+class PotcarLibrary:
+    """Index of a library of pseudopotentials (e.g., `potpaw_PBE`), which contains one directory (with a `POTCAR`
+    file) per pseudopotential.
+    The index is stored in `index_path` (by default, in `default_cache_directory()`), and an entry is only (re)built
+    when the corresponding `POTCAR` is new or if its size or modification time changed.
+    """
+
+    def __init__(self, root: pathlib.Path, index_path: Optional[pathlib.Path] = None):
+        self.root = pathlib.Path(root).resolve()
+
+        if index_path is None:
+            index_path = default_cache_directory() / 'potcar_index_{}.json'.format(
+                hashlib.sha256(str(self.root).encode()).hexdigest()[:16])
+
+        self.index_path = index_path
+        self.entries: Dict[str, PotcarEntry] = {}
+        self._modified = False
+
+        if self.index_path.exists():
+            with self.index_path.open() as f:
+                index = json.load(f)
+
+            if index.get('version') == INDEX_VERSION and index.get('root') == str(self.root):
+                self.entries = dict((name, PotcarEntry(**entry)) for name, entry in index['entries'].items())
+
+    def path(self, name: str) -> pathlib.Path:
+        return self.root / name / 'POTCAR'
+
+    def __getitem__(self, name: str) -> PotcarEntry:
+        """Get the entry corresponding to pseudopotential `name`, only reading the `POTCAR` if the entry is stale
+        """
+
+        path = self.path(name)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            raise KeyError('no pseudopotential `{}` in `{}`'.format(name, self.root))
+
+        entry = self.entries.get(name)
+        if entry is None or entry.size != stat.st_size or entry.mtime != stat.st_mtime:
+            content = path.read_bytes()
+            zvals = get_zvals(io.StringIO(content.decode()))
+            if len(zvals) == 0:
+                raise KeyError('no `ZVAL` in `{}`'.format(path))
+
+            entry = PotcarEntry(
+                path=str(path),
+                zval=next(iter(zvals.values())),
+                size=stat.st_size,
+                mtime=stat.st_mtime,
+                checksum=hashlib.sha256(content).hexdigest()
+            )
+
+            self.entries[name] = entry
+            self._modified = True
+
+        return entry
+
+    def save(self):
+        """Save the index, if it was modified
+        """
+
+        if not self._modified:
+            return
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # write in a temporary file first, so that a concurrent process never reads a partial index
+        tmp_path = self.index_path.with_name('{}.{}.tmp'.format(self.index_path.name, os.getpid()))
+        with tmp_path.open('w') as f:
+            json.dump({
+                'version': INDEX_VERSION,
+                'root': str(self.root),
+                'entries': dict((name, entry._asdict()) for name, entry in self.entries.items())
+            }, f)
+
+        tmp_path.replace(self.index_path)
+        self._modified = False
+
+    def pseudos(self, geometry: Geometry, translate: Optional[Dict[str, str]] = None) -> List[str]:
+        """Get the name of the pseudopotential of each ion type of `geometry`, possibly replaced using `translate`
+        """
+
+        translate = {} if translate is None else translate
+        return [translate.get(ion_type, ion_type) for ion_type in geometry.ion_types]
+
+    def nelect(self, geometry: Geometry, translate: Optional[Dict[str, str]] = None) -> float:
+        """Compute the number of electrons of `geometry`, using the index only
+        """
+
+        return sum(
+            n * self[name].zval for n, name in zip(geometry.ion_numbers, self.pseudos(geometry, translate)))
+
+    def write_potcar(self, geometry: Geometry, f: BinaryIO, translate: Optional[Dict[str, str]] = None):
+        """Write the `POTCAR` corresponding to `geometry` in `f` (opened in binary mode), by concatenating files
+        """
+
+        for name in self.pseudos(geometry, translate):
+            with self.path(name).open('rb') as fp:
+                shutil.copyfileobj(fp, f)
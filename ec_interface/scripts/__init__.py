@@ -4,6 +4,8 @@ import pathlib
 import numpy
 from numpy._typing import NDArray
 
+from typing import Dict, Tuple
+
 from ec_interface.ec_parameters import ECParameters
 
 INPUT_NAME = 'ec_interface.yml'
@@ -58,3 +60,80 @@ def get_vec(inp: str) -> NDArray:
         return numpy.array([float(x) for x in elmts])
     except ValueError:
         raise argparse.ArgumentTypeError('COM shift must be 3 floats')
+
+
+def get_floats(inp: str) -> NDArray:
+    """Get a list of floats, either as `a,b,c` or as a range `start:stop:step` (`stop` included)
+    """
+
+    try:
+        if ':' in inp:
+            elmts = [float(x) for x in inp.split(':')]
+            if len(elmts) != 3 or elmts[2] <= 0:
+                raise argparse.ArgumentTypeError('Range must be `start:stop:step`, with `step` > 0')
+
+            return numpy.arange(elmts[0], elmts[1] + elmts[2] / 2, elmts[2])
+        else:
+            return numpy.array([float(x) for x in inp.split(',')])
+    except ValueError:
+        raise argparse.ArgumentTypeError('`{}` is not a list of floats'.format(inp))
+
+
+def translate_list(inp: str) -> Dict[str, str]:
+    tr = {}
+    if len(inp) > 0:
+        chunks = inp.split(',')
+        for chunk in chunks:
+            try:
+                key, val = chunk.split('=')
+                tr[key] = val
+            except ValueError:
+                raise argparse.ArgumentTypeError('Must be `key=val`')
+
+    return tr
+
+
+def get_slice(inp: str) -> slice:
+    """Get a slice, either as `i` (a single element) or as `start:stop[:step]` (any of them can be omitted)
+    """
+
+    try:
+        elmts = [int(x) if x != '' else None for x in inp.split(':')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('`{}` is not a valid slice'.format(inp))
+
+    if len(elmts) == 1:
+        if elmts[0] is None:
+            raise argparse.ArgumentTypeError('`{}` is not a valid slice'.format(inp))
+
+        return slice(elmts[0], elmts[0] + 1 if elmts[0] != -1 else None)
+    elif len(elmts) <= 3:
+        return slice(*elmts)
+    else:
+        raise argparse.ArgumentTypeError('`{}` is not a valid slice'.format(inp))
+
+
+def get_periods(inp: str) -> Tuple[float, ...]:
+    """Get one or two periods (for macroscopic averages), as `a` or `a,b`
+    """
+
+    periods = get_floats(inp)
+    if len(periods) not in (1, 2) or numpy.any(periods <= 0):
+        raise argparse.ArgumentTypeError('Must be one or two positive periods')
+
+    return tuple(periods)
+
+
+def get_miller_indices(inp: str) -> Tuple[int, int, int]:
+    """Get Miller indices, as `h,k,l`
+    """
+
+    try:
+        indices = tuple(int(x) for x in inp.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError('Miller indices must be integers, got `{}`'.format(inp))
+
+    if len(indices) != 3 or all(x == 0 for x in indices):
+        raise argparse.ArgumentTypeError('Must be three Miller indices, not all zero, as `h,k,l`')
+
+    return indices
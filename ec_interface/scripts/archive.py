@@ -0,0 +1,86 @@
+"""
+Pack the grids (CHGCAR, LOCPOT) of all the calculations of an EC series into a single (compressed) HDF5 file
+"""
+
+import argparse
+import pathlib
+import sys
+
+import h5py
+
+from typing import List
+
+from ec_interface.ec_parameters import ECParameters
+from ec_interface.scripts import INPUT_NAME, get_ec_parameters
+from ec_interface.vasp_results import GridSource, write_grid_dataset
+
+ARCHIVE_NAME = 'ec_grids.h5'
+
+# (approximate) number of values per chunk
+CHUNK_SIZE = 2 ** 17
+
+
+def archive_grids(
+    parameters: ECParameters,
+    output: pathlib.Path,
+    names: List[str],
+    compression: str = 'gzip',
+    verbose: bool = False
+):
+    """Write the grids `names` of each calculation in `output`, as datasets `{directory}/{name}` (e.g.,
+    `EC_20.990/CHGCAR`), chunked by blocks of z-planes and compressed.
+    Each grid is read by blocks, so that only one block is in memory at a time.
+    The number of electrons is stored as the `nelect` attribute of the groups and datasets.
+    """
+
+    this_directory = pathlib.Path('.')
+
+    with h5py.File(output, 'w') as f:
+        f.attrs['version'] = 1
+
+        for nelect, directory in zip(parameters.steps(), parameters.directories(this_directory)):
+            group = f.create_group(directory.name)
+            group.attrs['nelect'] = nelect
+
+            for name in names:
+                path = directory / name
+                if not path.exists():
+                    print('warning: `{}` does not exists, skipped'.format(path), file=sys.stderr)
+                    continue
+
+                if verbose:
+                    print('- Packing', path, flush=True)
+
+                with GridSource(path) as source:
+                    num_planes = max(1, CHUNK_SIZE // (source.grid_size[0] * source.grid_size[1]))
+                    dset = write_grid_dataset(
+                        group,
+                        name,
+                        source.geometry,
+                        source.grid_size,
+                        source.blocks(num_planes),
+                        num_planes=num_planes,
+                        compression=compression
+                    )
+
+                    dset.attrs['nelect'] = nelect
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-p', '--parameters', default=INPUT_NAME, type=get_ec_parameters)
+    parser.add_argument('-f', '--files', default='CHGCAR,LOCPOT', help='Grids to pack (comma-separated)')
+    parser.add_argument('-o', '--output', default=ARCHIVE_NAME)
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose')
+
+    args = parser.parse_args()
+
+    try:
+        archive_grids(args.parameters, pathlib.Path(args.output), args.files.split(','), verbose=args.verbose)
+    except (FileNotFoundError, ValueError) as e:
+        print('error:', e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Integrate the density (CHGCAR) around each atom (Voronoi partition, possibly weighted by radii), and report the charges
+per atom, ion type, or layer. Without CHGCAR, the calculations of the EC series are used.
+"""
+
+import argparse
+import pathlib
+import sys
+
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from ec_interface.atomic_partition import AtomicPartition
+from ec_interface.scripts import INPUT_NAME, assert_exists, get_ec_parameters, translate_list
+from ec_interface.vasp_results import VaspChgCar
+
+
+def get_radii(inp: str) -> Dict[str, float]:
+    """Get radii, as `A=r1,B=r2`
+    """
+
+    try:
+        return dict((k, float(v)) for k, v in translate_list(inp).items())
+    except ValueError:
+        raise argparse.ArgumentTypeError('Radii must be `symbol=radius`, with `radius` a float')
+
+
+def get_arguments_parser():
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument('infiles', nargs='*', help='CHGCAR files', type=pathlib.Path)
+    parser.add_argument('-p', '--parameters', default=INPUT_NAME, help='EC parameters (if no CHGCAR is given)')
+    parser.add_argument(
+        '-r', '--radii', type=get_radii, default={}, help='Radii (in Å) of the ion types, as `A=r1,B=r2`')
+    parser.add_argument(
+        '-g', '--group-by', choices=['atom', 'species', 'layer'], default='species', help='Report charges per')
+    parser.add_argument('-t', '--tolerance', type=float, default=.5, help='Maximum distance (in Å) within a layer')
+    parser.add_argument('-o', '--output', default=sys.stdout, type=argparse.FileType('w'))
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose')
+
+    return parser
+
+
+def _columns(partition: AtomicPartition, group_by: str, tolerance: float) -> List[str]:
+    geometry = partition.geometry
+
+    if group_by == 'atom':
+        return ['{}{}'.format(symbol, i + 1) for i, symbol in enumerate(geometry.ions)]
+    elif group_by == 'species':
+        return list(geometry.ion_types)
+    else:
+        return ['Layer {}'.format(i) for i in range(geometry.layers(tolerance).max() + 1)]
+
+
+def atomic_charges(
+    sources: List[Tuple[str, pathlib.Path]],
+    output: TextIO,
+    first_column: str = 'File',
+    radii: Optional[Dict[str, float]] = None,
+    group_by: str = 'species',
+    tolerance: float = .5,
+    verbose: bool = False
+):
+    """Write the charges (in e) of each `(label, path)` of `sources`, one line each.
+    The partition is only computed again if the geometry or the size of the grid changes.
+    """
+
+    partition = None
+    columns = None
+
+    for label, path in sources:
+        if verbose:
+            print('- Reading', path, file=sys.stderr, flush=True)
+
+        with assert_exists(path).open() as f:
+            data = VaspChgCar.from_file(f)
+
+        if partition is None or not partition.matches(data):
+            if verbose:
+                print('  compute partition for a grid of {}'.format(data.grid_data.shape), file=sys.stderr, flush=True)
+
+            partition = AtomicPartition(data.geometry, data.grid_data.shape, radii)
+
+            new_columns = _columns(partition, group_by, tolerance)
+            if columns is None:
+                columns = new_columns
+                output.write('{}\t{}\n'.format(first_column, '\t'.join(columns)))
+            elif new_columns != columns:
+                raise ValueError('`{}` does not contain the same {}s as the previous files'.format(path, group_by))
+
+        charges = partition.integrate(data)
+
+        if group_by == 'species':
+            charges = partition.per_species(charges)
+        elif group_by == 'layer':
+            charges = partition.per_layer(charges, tolerance)
+
+        output.write('{}\t{}\n'.format(label, '\t'.join('{:.5f}'.format(x) for x in charges)))
+        output.flush()
+
+
+def main():
+    args = get_arguments_parser().parse_args()
+
+    try:
+        if len(args.infiles) > 0:
+            sources = [(str(path), path) for path in args.infiles]
+            first_column = 'File'
+        else:
+            parameters = get_ec_parameters(args.parameters)
+            sources = [
+                ('{:.3f}'.format(n), directory / 'CHGCAR')
+                for n, directory in zip(parameters.steps(), parameters.directories(pathlib.Path('.')))
+            ]
+            first_column = 'NELECT'
+
+        atomic_charges(
+            sources,
+            args.output,
+            first_column=first_column,
+            radii=args.radii,
+            group_by=args.group_by,
+            tolerance=args.tolerance,
+            verbose=args.verbose
+        )
+    except (argparse.ArgumentTypeError, FileNotFoundError, ValueError) as e:
+        print('error:', e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,18 @@
 """
-Get info about a slab geometry
+Get info about a slab geometry, from a POSCAR or from a grid file (CHGCAR, LOCPOT), of which only the header is read.
 """
 
 import argparse
 import numpy
 
-from ec_interface.vasp_geometry import Geometry
+from ec_interface.vasp_results import VaspResultGrid
 
 
 def get_arguments_parser():
     parser = argparse.ArgumentParser(description=__doc__)
 
-    parser.add_argument('infile', help='source', type=argparse.FileType('r'))
+    parser.add_argument('infile', help='source (POSCAR, CHGCAR, or LOCPOT)', type=argparse.FileType('r'))
+    parser.add_argument('-t', '--tolerance', type=float, default=.5, help='Maximum distance (in Å) within a layer')
 
     return parser
 
@@ -19,7 +20,8 @@ def get_arguments_parser():
 def main():
     args = get_arguments_parser().parse_args()
 
-    geometry = Geometry.from_poscar(args.infile)
+    info = VaspResultGrid.read_header(args.infile)
+    geometry = info.geometry
 
     if not numpy.allclose(geometry.lattice_vectors[2, :2], [.0, .0], rtol=1e-3):
         print('**WARNING: C lattice vector and Z axis does not match, this might affect the results!')
@@ -27,4 +29,39 @@ def main():
     print('Slab thickness: {:.4f} Å'.format(geometry.slab_thickness()))
     print('Slab surface: {:.4f} Å²'.format(numpy.linalg.det(geometry.lattice_vectors[:2, :2])))
     print('Interslab distance: {:.4f} Å'.format(geometry.interslab_distance()))
-    print('Vacuum fraction: {:.4f}'.format(geometry.interslab_distance() / geometry.lattice_vectors[2, 2]))
+    print('Vacuum fraction: {:.4f}'.format(geometry.interslab_distance() / geometry.cell_height()))
+
+    if info.grid_size is not None:
+        print('Grid: {} x {} x {} points (spacing: {:.4f}, {:.4f}, {:.4f} Å)'.format(*info.grid_size, *info.spacing()))
+
+    # layers
+    layers = geometry.layers(args.tolerance)
+    num_layers = layers.max() + 1 if len(geometry) > 0 else 0
+    counts = numpy.bincount(layers, minlength=num_layers)
+
+    # average positions (along the normal to the slab, as in `layers()`) around an atom of each layer, so that a layer
+    # crossing the cell boundary is not averaged in the vacuum
+    direct_z = geometry.direct_coordinates()[:, 2]
+    references = numpy.zeros(num_layers)
+    references[layers] = direct_z
+    offsets = (direct_z - references[layers] + .5) % 1. - .5
+    z_positions = (references + numpy.bincount(layers, weights=offsets, minlength=num_layers) / counts) % 1. * \
+        geometry.cell_height()
+
+    compositions = numpy.bincount(
+        layers * len(geometry.ion_types) + geometry.species, minlength=num_layers * len(geometry.ion_types)
+    ).reshape(num_layers, len(geometry.ion_types))
+
+    frozen = None
+    if geometry.selective_dynamics is not None:
+        frozen = numpy.bincount(layers, weights=~geometry.selective_dynamics.any(axis=1), minlength=num_layers)
+
+    print('Layers ({}, tolerance: {:.2f} Å, from bottom to top):'.format(num_layers, args.tolerance))
+    for i in range(num_layers):
+        print('  {:3d}: z = {:8.4f} Å, {:4d} atoms ({}){}'.format(
+            i,
+            z_positions[i],
+            counts[i],
+            ' '.join('{}{}'.format(t, n) for t, n in zip(geometry.ion_types, compositions[i]) if n > 0),
+            ', {:d} frozen'.format(int(frozen[i])) if frozen is not None else ''
+        ))
@@ -6,7 +6,7 @@ import argparse
 import numpy
 import sys
 
-from ec_interface.ec_results import ECResults
+from ec_interface.ec_results import ECResults, FEESurrogate
 from ec_interface.scripts import get_ec_parameters, INPUT_NAME, H5_NAME
 
 
@@ -27,6 +27,9 @@ def main():
         '--hbm-fermi', action='store_true', help='Assume the HBM approach, but use the Fermi energy for work function')
 
     parser.add_argument('--shift-avg', action='store_true', help='Shift the FEE with the average potential at PZC')
+    parser.add_argument(
+        '--surrogate', type=str, help='Save a polynomial fit of FEE vs work function in the H5 file, with this name')
+    parser.add_argument('--order', type=int, default=2, help='Order of the polynomial fit for `--surrogate`')
 
     args = parser.parse_args()
 
@@ -71,13 +74,17 @@ def main():
         numpy.savetxt(args.output, results, delimiter='\t')
 
     # Estimate differential capacitance
-    fit_2 = numpy.polyfit(results[:, 1], results[:, 3], 2)  # grand pot vs work function
+    fit_2 = FEESurrogate.from_fee(results, 2)  # grand pot vs work function
     args.output.write(
         '\n\n'
         'Capacitance [e/V]\n'
-        '{:.5f}\n'.format(-fit_2[0] * 2)
+        '{:.5f}\n'.format(fit_2.capacitance(.0))
     )
 
+    # save surrogate, if requested
+    if args.surrogate:
+        FEESurrogate.from_fee(results, args.order).to_hdf5(args.h5, args.surrogate)
+
     args.output.close()
 
 
@@ -13,13 +13,15 @@ def main():
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument('-p', '--parameters', default=INPUT_NAME, type=get_ec_parameters)
     parser.add_argument('-o', '--output', default=H5_NAME)
+    parser.add_argument('-A', '--archive', type=pathlib.Path, help='Read grids from this archive (see `ei-archive`)')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose')
 
     args = parser.parse_args()
     this_directory = pathlib.Path('.')
 
     # extract data
-    ec_results = ECResults.from_calculations(args.parameters, this_directory, verbose=args.verbose)
+    ec_results = ECResults.from_calculations(
+        args.parameters, this_directory, verbose=args.verbose, archive=args.archive)
 
     # write results
     ec_results.to_hdf5(pathlib.Path(args.output))
@@ -5,31 +5,75 @@ Compute the Fukui function
 import argparse
 import sys
 
-from ec_interface.vasp_results import VaspResultGrid
+from ec_interface.vasp_results import VaspResultGrid, GridSource, write_grid_blocks
 
 
 def get_arguments_parser():
     parser = argparse.ArgumentParser(description=__doc__)
 
-    parser.add_argument('ref', help='ρ(N) (CHGCAR)', type=argparse.FileType('r'))
-    parser.add_argument('add', help='ρ(N+ΔN) (CHGCAR)', type=argparse.FileType('r'))
+    parser.add_argument(
+        'ref', help='ρ(N) (CHGCAR, or a dataset of an archive, e.g., `ec_grids.h5:EC_20.990/CHGCAR`)',
+        type=GridSource.from_spec)
+    parser.add_argument('add', help='ρ(N+ΔN) (same)', type=GridSource.from_spec)
     parser.add_argument(
         '-s', '--symmetric', help='ref is ρ(N-ΔN) instead and symmetric difference is used', action='store_true')
     parser.add_argument('-d', '--delta', help='value of Δe', type=float, required=True)
+    parser.add_argument(
+        '-S', '--stream', action='store_true', help='Read and write files by blocks, so that memory usage is constant')
+    parser.add_argument('-n', '--num-planes', type=int, default=1, help='Number of z-planes per block (with `-S`)')
 
     parser.add_argument('-o', '--output', default=sys.stdout, type=argparse.FileType('w'))
 
     return parser
 
 
+def stream(args: argparse.Namespace) -> bool:
+    """Walk both grids (of which the headers are already read) in lockstep, and write the difference one block at a
+    time. Returns `False` if the grids do not have the same size, so that it cannot be done.
+    """
+
+    if args.ref.grid_size != args.add.grid_size:
+        return False
+
+    denominator = (2 if args.symmetric else 1) * args.delta
+
+    print('! differentiate{}, by blocks'.format(' using symmetric difference' if args.symmetric else ''))
+    write_grid_blocks(args.output, args.ref.geometry, args.ref.grid_size, (
+        (block_add - block_ref) / denominator for block_ref, block_add in zip(
+            args.ref.blocks(args.num_planes),
+            args.add.blocks(args.num_planes)
+        )
+    ))
+
+    return True
+
+
 def main():
     args = get_arguments_parser().parse_args()
 
-    # read up
-    print('! reading {} CHGCAR file'.format('ρ(N-ΔN)' if args.symmetric else 'ρ(N)'))
-    data_ref = VaspResultGrid.from_file(args.ref)
-    print('! reading ρ(N+ΔN) CHGCAR file')
-    data_add = VaspResultGrid.from_file(args.add)
+    try:
+        with args.ref, args.add:
+            if not args.ref.geometry.same_cell(args.add.geometry):
+                raise ValueError('`{}` and `{}` are not defined on the same cell'.format(args.ref, args.add))
+
+            if args.stream:
+                if stream(args):
+                    return
+
+                print('! grids do not have the same size, cannot work by blocks')
+
+            # read up
+            print('! reading {} CHGCAR file'.format('ρ(N-ΔN)' if args.symmetric else 'ρ(N)'))
+            data_ref = args.ref.read()
+            print('! reading ρ(N+ΔN) CHGCAR file')
+            data_add = args.add.read()
+    except (FileNotFoundError, ValueError) as e:
+        print('error:', e, file=sys.stderr)
+        sys.exit(1)
+
+    if data_add.grid_data.shape != data_ref.grid_data.shape:
+        print('! resample ρ(N+ΔN) from {} to {}'.format(data_add.grid_data.shape, data_ref.grid_data.shape))
+        data_add = data_add.resample(data_ref.grid_data.shape)
 
     # differentiate
     print('! differentiate{}'.format(' using symmetric difference' if args.symmetric else ''))
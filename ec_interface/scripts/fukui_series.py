@@ -0,0 +1,118 @@
+"""
+Compute the Fukui function (i.e., the derivative of the density with respect to the number of electrons) for each
+step of an EC calculation
+"""
+
+import argparse
+import pathlib
+import sys
+
+import h5py
+import numpy
+
+from typing import Iterator, List
+
+from ec_interface.ec_parameters import ECParameters
+from ec_interface.finite_differences import sliding_derivatives
+from ec_interface.scripts import INPUT_NAME, get_ec_parameters, assert_exists
+from ec_interface.vasp_results import VaspChgCar
+
+FUKUI_NAME = 'ec_fukui.h5'
+
+
+def read_densities(
+    directories: List[pathlib.Path], planar: bool = False, verbose: bool = False
+) -> Iterator[numpy.ndarray]:
+    """Read the density of each directory (or its planar average, if `planar`), in order.
+    Densities are resampled to the grid of the first one if needed, which requires the cells to be the same.
+    """
+
+    geometry, grid_size = None, None
+
+    for directory in directories:
+        path_chgcar = assert_exists(directory / 'CHGCAR')
+        if verbose:
+            print('- Reading', path_chgcar, flush=True)
+
+        with path_chgcar.open() as f:
+            data = VaspChgCar.from_file(f)
+
+        if grid_size is None:
+            geometry, grid_size = data.geometry, data.grid_data.shape
+        elif not data.geometry.same_cell(geometry):
+            raise ValueError(
+                '`{}` is not defined on the same cell as `{}`'.format(path_chgcar, directories[0] / 'CHGCAR'))
+        elif data.grid_data.shape != grid_size:
+            if verbose:
+                print('  resample from {} to {}'.format(data.grid_data.shape, grid_size))
+            data = data.resample(grid_size)
+
+        yield data.xy_planar_average().values if planar else data.grid_data
+
+
+def compute_fukui_series(
+    parameters: ECParameters,
+    output: pathlib.Path,
+    half_width: int = 1,
+    planar: bool = False,
+    verbose: bool = False
+):
+    """Compute the Fukui function at each step, using finite differences with `2 * half_width + 1` points,
+    and store the results in the `fukui` dataset of `output` (one row per step, as soon as it is available).
+    Each `CHGCAR` is read only once.
+    """
+
+    this_directory = pathlib.Path('.')
+
+    nelects = list(parameters.steps())
+    directories = list(parameters.directories(this_directory))
+
+    with h5py.File(output, 'w') as f:
+        f.create_dataset('nelects', data=nelects)
+        dset = None
+
+        for i, derivative in sliding_derivatives(
+                nelects, read_densities(directories, planar=planar, verbose=verbose), half_width):
+
+            if dset is None:
+                dset = f.create_dataset(
+                    'fukui',
+                    shape=(len(nelects), *derivative.shape),
+                    dtype=float,
+                    chunks=(1, len(derivative)) if planar else (1, *derivative.shape[:2], 1)
+                )
+
+                dset.attrs['version'] = 1
+                dset.attrs['planar'] = planar
+                dset.attrs['half_width'] = half_width
+
+            dset[i] = derivative
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-p', '--parameters', default=INPUT_NAME, type=get_ec_parameters)
+    parser.add_argument(
+        '-w', '--half-width', type=int, default=1,
+        help='Use 2*w+1 points for the finite differences (1: 3-point central difference)')
+    parser.add_argument('-P', '--planar', action='store_true', help='Store the XY planar average only')
+    parser.add_argument('-o', '--output', default=FUKUI_NAME)
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose')
+
+    args = parser.parse_args()
+
+    try:
+        compute_fukui_series(
+            args.parameters,
+            pathlib.Path(args.output),
+            half_width=args.half_width,
+            planar=args.planar,
+            verbose=args.verbose
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print('error:', e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,10 @@ Get the value of NELECT for zero-charge system
 """
 
 import argparse
+import sys
 
+from ec_interface.potcar_library import PotcarLibrary
+from ec_interface.scripts import get_directory, translate_list
 from ec_interface.vasp_geometry import Geometry
 
 
@@ -11,14 +14,35 @@ def get_arguments_parser():
     parser = argparse.ArgumentParser(description=__doc__)
 
     parser.add_argument('infile', help='source', type=argparse.FileType('r'))
-    parser.add_argument('potcar', help='POTCAR file', type=argparse.FileType('r'))
+    parser.add_argument('potcar', help='POTCAR file', type=argparse.FileType('r'), nargs='?')
+    parser.add_argument(
+        '-p', '--potpaw', type=get_directory, help='Root of VASP PP (use an index instead of a POTCAR file)')
+    parser.add_argument(
+        '-P', '--pseudos', type=translate_list, help='replace a given symbol by a different PP', default=''
+    )
 
     return parser
 
 
 def main():
-    args = get_arguments_parser().parse_args()
+    parser = get_arguments_parser()
+    args = parser.parse_args()
+
+    if (args.potcar is None) == (args.potpaw is None):
+        parser.error('either a POTCAR file or `--potpaw` is required')
 
     # get geometry
     geometry = Geometry.from_poscar(args.infile)
-    print(geometry.nelect(args.potcar))
+
+    if args.potcar is not None:
+        print(geometry.nelect(args.potcar))
+    else:
+        library = PotcarLibrary(args.potpaw)
+
+        try:
+            print(library.nelect(geometry, args.pseudos))
+        except KeyError as e:
+            print('error:', e.args[0], file=sys.stderr)
+            sys.exit(1)
+
+        library.save()
@@ -3,20 +3,25 @@ Extract work function from a given calculation, for debugging purposes
 """
 
 import argparse
+import pathlib
 
 from ec_interface.ec_results import _extract_data
-from ec_interface.scripts import get_directory
+from ec_interface.scripts import get_directory, get_periods
 
 
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument('directory', type=get_directory, help='Directory where the calculation is')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose')
+    parser.add_argument(
+        '-m', '--macro', type=get_periods, help='Use the macroscopic average of the potential, with period(s) `a[,b]`')
+    parser.add_argument('-A', '--archive', type=pathlib.Path, help='Read grids from this archive (see `ei-archive`)')
 
     args = parser.parse_args()
 
     # extract data
-    _, _, fermi_energy, vacuum_potential, _ = _extract_data(args.directory, save_averages=False, verbose=args.verbose)
+    _, _, fermi_energy, vacuum_potential, _ = _extract_data(
+        args.directory, save_averages=False, verbose=args.verbose, macro=args.macro, archive=args.archive)
     print('{:.3f} [V]'.format(vacuum_potential - fermi_energy))
 
 
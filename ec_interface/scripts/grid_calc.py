@@ -0,0 +1,112 @@
+"""
+Compute a linear combination of grids (e.g., CHGCAR), such as a charge density difference.
+Grids are read (and the result written) by blocks, so that memory usage does not depend on the size of the grids
+(except for the grids that need to be resampled to the size of the first one).
+"""
+
+import argparse
+import contextlib
+import pathlib
+import sys
+
+import numpy
+
+from typing import Dict, Iterator, Tuple
+
+from ec_interface.grid_calc import parse_expression, evaluate_blocks, ExpressionError
+from ec_interface.vasp_results import (
+    VaspResultGrid, is_hdf5, read_grid_header, read_grid_blocks, split_grid_spec, write_grid_blocks,
+    write_grid_blocks_hdf5
+)
+
+
+def get_operand(inp: str) -> Tuple[str, pathlib.Path]:
+    try:
+        name, path = inp.split('=', 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError('operand must be `name=path`')
+
+    if not name.isidentifier():
+        raise argparse.ArgumentTypeError('`{}` is not a valid name'.format(name))
+
+    return name, pathlib.Path(path)
+
+
+def get_arguments_parser():
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument('expression', help='linear combination of grids, e.g., `a - b - c`')
+    parser.add_argument('operands', help='grid files, as `name=path`', type=get_operand, nargs='+')
+
+    parser.add_argument('-n', '--num-planes', type=int, default=1, help='Number of z-planes per block')
+    parser.add_argument(
+        '-o', '--output', default='-',
+        help='output (a HDF5 file if it ends with `.h5` or `.hdf5`, or a dataset of one, as `file.h5:dataset`)')
+
+    return parser
+
+
+def _split_blocks(grid_data: numpy.ndarray, num_planes: int) -> Iterator[numpy.ndarray]:
+    for z_start in range(0, grid_data.shape[2], num_planes):
+        yield grid_data[:, :, z_start:z_start + num_planes]
+
+
+def grid_calc(expression: str, operands: Dict[str, pathlib.Path], output: str, num_planes: int = 1):
+    coefficients, constant = parse_expression(expression)
+
+    missing = set(coefficients.keys()) - set(operands.keys())
+    if len(missing) > 0:
+        raise ExpressionError('missing operand(s): {}'.format(', '.join(sorted(missing))))
+
+    if len(coefficients) == 0:
+        raise ExpressionError('expression does not contain any grid')
+
+    with contextlib.ExitStack() as stack:
+        # read headers, and check that grids agree
+        files = dict((name, stack.enter_context(operands[name].open())) for name in coefficients)
+        headers = dict((name, read_grid_header(f)) for name, f in files.items())
+
+        first = next(iter(coefficients))
+        geometry, grid_size = headers[first]
+
+        blocks = {}
+        for name, (other_geometry, other_grid_size) in headers.items():
+            if not other_geometry.same_cell(geometry):
+                raise ExpressionError('cell of `{}` differs from the one of `{}`'.format(name, first))
+
+            if other_grid_size == grid_size:
+                blocks[name] = read_grid_blocks(files[name], grid_size, num_planes)
+            else:
+                # grid has to be read in memory to be resampled
+                grid = VaspResultGrid(
+                    other_geometry, next(read_grid_blocks(files[name], other_grid_size, other_grid_size[2])))
+                blocks[name] = _split_blocks(grid.resample(grid_size).grid_data, num_planes)
+
+        # compute
+        result = evaluate_blocks(coefficients, constant, blocks)
+
+        output_path, output_dataset = split_grid_spec(output)
+
+        if output_dataset is not None:
+            write_grid_blocks_hdf5(output_path, geometry, grid_size, result, name=output_dataset, mode='a')
+        elif is_hdf5(output_path):
+            write_grid_blocks_hdf5(output_path, geometry, grid_size, result)
+        elif output == '-':
+            write_grid_blocks(sys.stdout, geometry, grid_size, result)
+        else:
+            with open(output, 'w') as f:
+                write_grid_blocks(f, geometry, grid_size, result)
+
+
+def main():
+    args = get_arguments_parser().parse_args()
+
+    try:
+        grid_calc(args.expression, dict(args.operands), args.output, num_planes=args.num_planes)
+    except (ExpressionError, ValueError, FileNotFoundError) as e:
+        print('error:', e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
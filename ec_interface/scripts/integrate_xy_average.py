@@ -1,57 +1,125 @@
 """
 Integrate density (CHGCAR) along an axis (by default, Z) and integrate in regions.
+Without CHGCAR, the ones of the EC series are used.
 """
 
 import argparse
+import pathlib
+import sys
 
-from ec_interface.vasp_results import VaspResultGrid
+import numpy
+
+from numpy.typing import NDArray
+from typing import List, TextIO, Tuple
+
+from ec_interface.scripts import INPUT_NAME, assert_exists, get_ec_parameters, get_floats
+from ec_interface.vasp_results import PlanarAverage, VaspResultGrid
 
 
 def get_arguments_parser():
     parser = argparse.ArgumentParser(description=__doc__)
 
-    parser.add_argument('infile', help='source', type=argparse.FileType('r'))
+    parser.add_argument('infiles', nargs='*', help='CHGCAR files', type=pathlib.Path)
+    parser.add_argument('-p', '--parameters', default=INPUT_NAME, help='EC parameters (if no CHGCAR is given)')
     parser.add_argument('-a', '--axis', default=2, type=int)
-    parser.add_argument('-t', '--threshold', default=1e-3, type=float)
+    parser.add_argument(
+        '-t', '--threshold', default='1e-3', type=get_floats, help='Threshold(s), as `a,b,c` or `start:stop:step`')
+    parser.add_argument('-T', '--table', action='store_true', help='Output a (tab-separated) table of the regions')
+    parser.add_argument('-o', '--output', default=sys.stdout, type=argparse.FileType('w'))
 
     return parser
 
 
-def main():
-    args = get_arguments_parser().parse_args()
+def integrate_regions(
+    sources: List[Tuple[str, pathlib.Path]],
+    thresholds: NDArray,
+    output: TextIO,
+    first_column: str = 'File',
+    axis: int = 2,
+    table: bool = False
+):
+    """Integrate the planar average of each `(label, path)` of `sources` in the regions given by each threshold.
+    Each file is only read once, whatever the number of thresholds.
+    """
+
+    if table:
+        output.write('{}\tThreshold\tRegion\tStart [Å]\tEnd [Å]\tCharge [e]\n'.format(first_column))
+
+    for label, path in sources:
+        if not table:
+            output.write('! reading {}\n'.format(path))
 
-    print('! reading CHGCAR file')
-    data = VaspResultGrid.from_file(args.infile)
+        with assert_exists(path).open() as f:
+            data = VaspResultGrid.from_file(f)
 
-    N = data.grid_data.shape[args.axis]
-    axis_max = data.geometry.lattice_vectors[args.axis, args.axis]
-    density = data.planar_average(args.axis).values / N
+        planar_average = data.planar_average(axis)
+        N = len(planar_average.values)
+        axis_max = planar_average.length
 
-    total = density.sum()
-    print('Total = {:.3f} [e]'.format(total))
+        # number of electrons in each plane
+        density = PlanarAverage(planar_average.values / N, axis_max)
+        threshold_index, starts, ends, charges = density.regions(thresholds)
 
-    regions = [0]
+        if table:
+            # regions are numbered for each threshold
+            regions = numpy.arange(len(threshold_index)) - numpy.searchsorted(threshold_index, threshold_index)
 
-    print('! find regions of integration using threshold = {}'.format(args.threshold))
-    # find areas
-    for i in range(1, density.shape[0]):
-        if density[i - 1] < args.threshold < density[i] or density[i - 1] > args.threshold > density[i]:
-            regions.append(i)
+            for k in range(len(threshold_index)):
+                output.write('{}\t{:.3e}\t{}\t{:.3f}\t{:.3f}\t{:.5f}\n'.format(
+                    label,
+                    thresholds[threshold_index[k]],
+                    regions[k],
+                    starts[k] / N * axis_max,
+                    ends[k] / N * axis_max,
+                    charges[k]
+                ))
 
-    regions.append(density.shape[0])  # add last point to complete the integration over whole space
+            continue
 
-    print('Found {} regions'.format(len(regions) - 1))
+        output.write('Total = {:.3f} [e]\n'.format(density.sum()))
 
-    # sum
-    print('! compute results')
-    for i in range(1, len(regions)):
-        beg, end = regions[i - 1], regions[i]
-        zbeg, zend = beg / N * axis_max, end / N * axis_max
+        for i, threshold in enumerate(thresholds):
+            regions = threshold_index == i
 
-        integ = density[beg:end].sum()
+            output.write('! find regions of integration using threshold = {}\n'.format(threshold))
+            output.write('Found {} regions\n'.format(regions.sum()))
+            output.write('! compute results\n')
+
+            for start, end, charge in zip(starts[regions], ends[regions], charges[regions]):
+                output.write('Charge in z ∈ [{:.3f},{:.3f}) = {:.3f} [e]\n'.format(
+                    start / N * axis_max,
+                    end / N * axis_max,
+                    charge
+                ))
+
+
+def main():
+    args = get_arguments_parser().parse_args()
 
-        print('Charge in z ∈ [{:.3f},{:.3f}) = {:.3f} [e]'.format(
-            zbeg,
-            zend,
-            integ
-        ))
+    try:
+        if len(args.infiles) > 0:
+            sources = [(str(path), path) for path in args.infiles]
+            first_column = 'File'
+        else:
+            parameters = get_ec_parameters(args.parameters)
+            sources = [
+                ('{:.3f}'.format(n), directory / 'CHGCAR')
+                for n, directory in zip(parameters.steps(), parameters.directories(pathlib.Path('.')))
+            ]
+            first_column = 'NELECT'
+
+        integrate_regions(
+            sources,
+            args.threshold,
+            args.output,
+            first_column=first_column,
+            axis=args.axis,
+            table=args.table
+        )
+    except (argparse.ArgumentTypeError, FileNotFoundError) as e:
+        print('error:', e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,30 +3,71 @@ Create directories for calculations
 """
 
 import argparse
+import difflib
+import hashlib
 import pathlib
 import re
 import shutil
 import sys
 
+import yaml
+
+from typing import Dict, List, Optional, Tuple
+
 from ec_interface.scripts import INPUT_NAME, get_ec_parameters, assert_exists
 from ec_interface.ec_parameters import ECParameters
 
+CHAIN_NAME = 'ec_chain.txt'
+MANIFEST_NAME = 'ec_manifest.yml'
+
+INPUT_FILES = ['POSCAR', 'POTCAR', 'KPOINTS']
+
+
+def _hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _hash_file(path: pathlib.Path) -> Optional[str]:
+    try:
+        return _hash(path.read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+def _read_manifest(path: pathlib.Path) -> Dict[str, dict]:
+    if not path.exists():
+        return {}
+
+    with path.open() as f:
+        return yaml.safe_load(f) or {}
+
 
 def create_input_directories(
     parameters: ECParameters,
     use_symlinks: bool = True,
     verbose: bool = False,
-    force: bool = True
-):
-    """Create directories containing input files, ready to compute
+    force: bool = True,
+    warm_start: bool = False,
+    dry_run: bool = False
+) -> List[Tuple[pathlib.Path, str]]:
+    """Create directories containing input files, ready to compute.
+
+    The inputs of each directory (hashes of `INCAR`, `POSCAR`, `POTCAR` and `KPOINTS`, and `NELECT`) are recorded
+    in `MANIFEST_NAME`, so that only missing directories are created and only stale ones are updated (their input
+    files are rewritten, other files are kept), unless `force` is set, in which case all directories are re-created.
+    If `dry_run` is set, nothing is written, but the changes are reported.
+
+    If `warm_start` is set, each calculation (except the one closest to zero charge) is set to restart from the
+    `WAVECAR` of its neighbour (closer to zero charge), and the order is written in `CHAIN_NAME`.
+
+    Returns the action performed for each directory (`create`, `recreate`, `update`, or `up-to-date`).
     """
 
     this_directory = pathlib.Path('.')
     incar_file = assert_exists(this_directory / 'INCAR')
 
-    assert_exists(this_directory / 'POSCAR')
-    assert_exists(this_directory / 'POTCAR')
-    assert_exists(this_directory / 'KPOINTS')
+    for p in INPUT_FILES:
+        assert_exists(this_directory / p)
 
     if verbose:
         print('making directories with', str(parameters))
@@ -41,34 +82,108 @@ def create_input_directories(
     if re.compile(r'NELECT\s*=\s*[0-9]*').search(incar_content):
         print('Warning: found `NELECT` in INCAR.')
 
+    starts_from = {}
+    if warm_start:
+        for keyword in ['ISTART', 'ICHARG']:
+            if re.compile(r'{}\s*='.format(keyword)).search(incar_content):
+                print('Warning: found `{}` in INCAR.'.format(keyword))
+
+        if re.compile(r'LWAVE\s*=\s*\.FALSE\.').search(incar_content):
+            print('Warning: found `LWAVE = .FALSE.` in INCAR, no WAVECAR will be available to start from.')
+
+        # write the order in which calculations should be performed
+        starts_from = dict(parameters.chain())
+        if not dry_run:
+            with (this_directory / CHAIN_NAME).open('w') as f:
+                for n, n_from in starts_from.items():
+                    f.write('{}\t{}\n'.format(
+                        parameters.directory(this_directory, n),
+                        '-' if n_from is None else parameters.directory(this_directory, n_from)
+                    ))
+
+    manifest_path = this_directory / MANIFEST_NAME
+    manifest = _read_manifest(manifest_path)
+    new_manifest = {}
+
+    inputs_hashes = dict((p, _hash_file(this_directory / p)) for p in INPUT_FILES)
+
     # create subdirs
+    actions = []
     for n, subdirectory in zip(parameters.steps(), parameters.directories(this_directory)):
-        if verbose:
-            print(subdirectory, '...', end=' ', flush=True)
 
-        if subdirectory.exists():
-            if force:
-                shutil.rmtree(subdirectory)
-            else:
-                print('Directory exists, skipping')
-                continue
+        # expected inputs
+        subdirectory_incar_content = incar_content + '\n! EC calculation\nNELECT = {:.3f}'.format(n)
+        if starts_from.get(n) is not None:
+            subdirectory_incar_content += '\n! start from WAVECAR of {}\nISTART = 1'.format(
+                parameters.directory(pathlib.Path('..'), starts_from[n]))
+
+        entry = dict(nelect=float(n), INCAR=_hash(subdirectory_incar_content.encode()), **inputs_hashes)
+        new_manifest[subdirectory.name] = entry
+
+        # check what to do
+        if not subdirectory.exists():
+            action = 'create'
+        elif force:
+            action = 'recreate'
+        else:
+            recorded = manifest.get(subdirectory.name)
+            if recorded is None:  # not in manifest, so check files
+                recorded = dict(nelect=float(n), **dict(
+                    (p, _hash_file(subdirectory / p)) for p in ['INCAR'] + INPUT_FILES))
+
+            action = 'up-to-date' if recorded == entry else 'update'
+
+        actions.append((subdirectory, action))
 
-        subdirectory.mkdir()
+        if verbose or dry_run:
+            print(subdirectory, '...', action, flush=True)
+
+        if dry_run:
+            if action == 'update':
+                path_incar = subdirectory / 'INCAR'
+                current_incar_content = path_incar.read_text() if path_incar.exists() else ''
+                sys.stdout.writelines(difflib.unified_diff(
+                    current_incar_content.splitlines(keepends=True),
+                    subdirectory_incar_content.splitlines(keepends=True),
+                    fromfile=str(path_incar),
+                    tofile=str(path_incar) + ' (new)'
+                ))
+                print()
+
+                for p in INPUT_FILES:
+                    if recorded.get(p) != entry[p]:
+                        print('{} changed'.format(subdirectory / p))
+
+            continue
+
+        if action == 'up-to-date':
+            continue
+
+        if action == 'recreate':
+            shutil.rmtree(subdirectory)
+
+        subdirectory.mkdir(exist_ok=True)
 
         # copy INCAR
         with (subdirectory / 'INCAR').open('w') as f:
-            f.write(incar_content)
-            f.write('\n! EC calculation\nNELECT = {:.3f}'.format(n))
+            f.write(subdirectory_incar_content)
 
         # create symlinks/copy other files
-        for p in ['POSCAR', 'POTCAR', 'KPOINTS']:
+        for p in INPUT_FILES:
+            path = subdirectory / p
+            if path.exists() or path.is_symlink():
+                path.unlink()
+
             if use_symlinks:
-                (subdirectory / p).symlink_to('../{}'.format(p))
+                path.symlink_to('../{}'.format(p))
             else:
-                shutil.copy(p, subdirectory / p)
+                shutil.copy(p, path)
+
+    if not dry_run:
+        with manifest_path.open('w') as f:
+            yaml.safe_dump(new_manifest, f)
 
-        if verbose:
-            print('ok', flush=True)
+    return actions
 
 
 def main():
@@ -77,12 +192,21 @@ def main():
     parser.add_argument('-c', '--copy-files', action='store_true', help='Copy files instead of using symlinks')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose')
     parser.add_argument('-f', '--force', action='store_true', help='Force re-creation of directories')
+    parser.add_argument(
+        '-w', '--warm-start', action='store_true', help='Start each calculation from the WAVECAR of its neighbour')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='Only report what would be done')
     args = parser.parse_args()
 
     # create directories
     try:
         create_input_directories(
-            args.parameters, use_symlinks=not args.copy_files, verbose=args.verbose, force=args.force)
+            args.parameters,
+            use_symlinks=not args.copy_files,
+            verbose=args.verbose,
+            force=args.force,
+            warm_start=args.warm_start,
+            dry_run=args.dry_run
+        )
     except Exception as e:
         print('error:', e, file=sys.stderr)
 
@@ -0,0 +1,59 @@
+"""
+Create a supercell
+"""
+
+import argparse
+import sys
+
+import numpy
+from numpy.typing import NDArray
+
+from ec_interface.vasp_geometry import Geometry
+
+
+def get_matrix(inp: str) -> NDArray:
+    elmts = inp.split(',')
+    if len(elmts) not in (3, 9):
+        raise argparse.ArgumentTypeError('Supercell matrix must have 3 (diagonal) or 9 elements')
+
+    try:
+        elmts = [int(x) for x in elmts]
+    except ValueError:
+        raise argparse.ArgumentTypeError('Supercell matrix must be integers')
+
+    if len(elmts) == 3:
+        return numpy.diag(elmts)
+    else:
+        return numpy.array(elmts).reshape(3, 3)
+
+
+def get_arguments_parser():
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument('infile', help='source', type=argparse.FileType('r'))
+    parser.add_argument(
+        '-m', '--matrix', type=get_matrix, default='1,1,1',
+        help='Supercell matrix, either `a,b,c` (diagonal) or 9 integers (row by row)')
+
+    parser.add_argument('-o', '--poscar', type=argparse.FileType('w'), default=sys.stdout)
+    parser.add_argument('-C', '--cartesian', action='store_true', help='Output in cartesian coordinates')
+
+    return parser
+
+
+def main():
+    args = get_arguments_parser().parse_args()
+
+    geometry = Geometry.from_poscar(args.infile)
+
+    try:
+        new_geometry = geometry.make_supercell(args.matrix)
+    except ValueError as e:
+        print('error:', e, file=sys.stderr)
+        sys.exit(1)
+
+    new_geometry.to_poscar(args.poscar, direct=not args.cartesian)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,14 +6,22 @@ import argparse
 import sys
 import numpy
 
-from ec_interface.vasp_results import VaspResultGrid
+from ec_interface.scripts import get_periods, get_miller_indices
+from ec_interface.vasp_results import GridSource
 
 
 def get_arguments_parser():
     parser = argparse.ArgumentParser(description=__doc__)
 
-    parser.add_argument('infile', help='source', type=argparse.FileType('r'))
+    parser.add_argument(
+        'infile', help='source (a file, or a dataset of an archive, e.g., `ec_grids.h5:EC_20.990/CHGCAR`)',
+        type=GridSource.from_spec)
     parser.add_argument('-a', '--axis', default=2, type=int)
+    parser.add_argument(
+        '-M', '--miller', type=get_miller_indices, help='Average over the `(hkl)` planes instead, given as `h,k,l`')
+    parser.add_argument('-b', '--bins', type=int, help='Number of bins along the normal to the `(hkl)` planes')
+    parser.add_argument(
+        '-m', '--macro', type=get_periods, help='Add the macroscopic average, with period(s) `a[,b]` (in Å)')
     parser.add_argument('-o', '--output', default=sys.stdout, type=argparse.FileType('w'))
 
     return parser
@@ -22,12 +30,21 @@ def get_arguments_parser():
 def main():
     args = get_arguments_parser().parse_args()
 
-    data = VaspResultGrid.from_file(args.infile)
+    try:
+        with args.infile:
+            data = args.infile.read()
 
-    N = data.grid_data.shape[args.axis]
-    axis_max = data.geometry.lattice_vectors[args.axis, args.axis]
-    values = numpy.arange(N) / N * axis_max
-    planar_average = data.planar_average(args.axis)
+        if args.miller is not None:
+            planar_average = data.miller_average(args.miller, num_bins=args.bins)
+        else:
+            planar_average = data.planar_average(args.axis)
+    except (FileNotFoundError, ValueError) as e:
+        print('error:', e, file=sys.stderr)
+        sys.exit(1)
 
-    numpy.savetxt(
-        args.output, numpy.array([values, planar_average.values, planar_average.values / N]).T, delimiter='\t')
+    N = len(planar_average.values)
+    columns = [planar_average.positions(), planar_average.values, planar_average.values / N]
+    if args.macro is not None:
+        columns.append(planar_average.macroscopic_average(*args.macro).values)
+
+    numpy.savetxt(args.output, numpy.array(columns).T, delimiter='\t')
@@ -4,10 +4,13 @@ The lattice vector of the first geometry is used in the final one.
 """
 
 import argparse
+import pathlib
 import sys
 
+import numpy
+
 from ec_interface.scripts import get_vec
-from ec_interface.vasp_geometry import Geometry
+from ec_interface.vasp_geometry import Geometry, OverlapError
 
 
 def get_arguments_parser():
@@ -17,6 +20,14 @@ def get_arguments_parser():
     parser.add_argument('additional', help='additional', type=argparse.FileType('r'))
 
     parser.add_argument('-s', '--shift', help='Shift positions', type=get_vec, default='0,0,0')
+    parser.add_argument(
+        '-S', '--shifts', type=argparse.FileType('r'),
+        help='File containing one shift per line: creates one directory per shift (see `--directory-format`)')
+    parser.add_argument(
+        '-D', '--directory-format', default='placement_{}',
+        help='Format of the directories (with the index of the shift)')
+    parser.add_argument(
+        '-d', '--min-distance', type=float, help='Reject the merge if atoms of the two geometries are closer than that')
 
     parser.add_argument('-o', '--poscar', type=argparse.FileType('w'), default=sys.stdout)
     parser.add_argument('-C', '--cartesian', action='store_true', help='Output in cartesian coordinates')
@@ -24,12 +35,54 @@ def get_arguments_parser():
     return parser
 
 
+def merge_many(geometry: Geometry, additional: Geometry, args: argparse.Namespace):
+    """Merge `additional` in `geometry` for each shift, and write the results in one directory per shift
+    """
+
+    shifts = numpy.loadtxt(args.shifts, ndmin=2)
+    if shifts.shape[1] != 3:
+        print('error: shifts must have three elements', file=sys.stderr)
+        sys.exit(1)
+
+    new_geometries, kept = geometry.merge_with_many(additional, shifts, min_distance=args.min_distance)
+
+    for i in numpy.setdiff1d(numpy.arange(len(shifts)), kept):
+        print('warning: placement {} discarded, as atoms are too close'.format(i), file=sys.stderr)
+
+    for i, new_geometry in zip(kept, new_geometries):
+        directory = pathlib.Path(args.directory_format.format(i))
+        directory.mkdir(exist_ok=True)
+
+        new_geometry.title = 'placement {} (shift: {:.4f} {:.4f} {:.4f})'.format(i, *shifts[i])
+        with (directory / 'POSCAR').open('w') as f:
+            new_geometry.to_poscar(f, direct=not args.cartesian)
+
+        print(directory)
+
+
 def main():
     args = get_arguments_parser().parse_args()
 
     geometry = Geometry.from_poscar(args.infile)
     additional = Geometry.from_poscar(args.additional)
-    geometry.merge_with(additional, shift=args.shift).to_poscar(args.poscar, direct=not args.cartesian)
+
+    if args.shifts is not None:
+        merge_many(geometry, additional, args)
+        return
+
+    try:
+        new_geometry = geometry.merge_with(additional, shift=args.shift, min_distance=args.min_distance)
+    except OverlapError as e:
+        print('error:', e, file=sys.stderr)
+
+        additional_ions, ions = additional.ions, geometry.ions
+        for i, j, d in zip(e.i, e.j, e.distances):
+            print('  - {} {} (additional) and {} {}: {:.3f} Å'.format(
+                additional_ions[i], i + 1, ions[j], j + 1, d), file=sys.stderr)
+
+        sys.exit(1)
+
+    new_geometry.to_poscar(args.poscar, direct=not args.cartesian)
 
 
 if __name__ == '__main__':
@@ -3,22 +3,37 @@ Change the interslab distance
 """
 
 import argparse
+import pathlib
+import shutil
 import sys
 
 import numpy
 
+from ec_interface.scripts import INPUT_NAME, get_floats
 from ec_interface.vasp_geometry import Geometry
 
+DIRECTORY_FORMAT = 'vacuum_{:.2f}'
+
+SERIES_INPUT_FILES = ['INCAR', 'POTCAR', 'KPOINTS', INPUT_NAME]
+
 
 def get_arguments_parser():
     parser = argparse.ArgumentParser(description=__doc__)
 
     parser.add_argument('infile', help='source', type=argparse.FileType('r'))
     parser.add_argument('-v', '--vacuum', type=float, default=5.0)
+    parser.add_argument(
+        '-s', '--series', type=get_floats,
+        help='Series of interslab distances, either `a,b,c` or `start:stop:step`: creates one directory per distance')
+    parser.add_argument(
+        '-d', '--directory-format', default=DIRECTORY_FORMAT, help='Format of the directories of a series')
 
     parser.add_argument('-o', '--poscar', type=argparse.FileType('w'), default=sys.stdout)
     parser.add_argument('-C', '--cartesian', action='store_true', help='Output in cartesian coordinates')
     parser.add_argument('-S', '--selective', action='store_true', help='Use selective dynamics')
+    parser.add_argument(
+        '-F', '--freeze-bottom', type=int, default=0, help='Freeze the N bottom layers (implies selective dynamics)')
+    parser.add_argument('-t', '--tolerance', type=float, default=.5, help='Maximum distance (in Å) within a layer')
 
     return parser
 
@@ -27,12 +42,34 @@ def main():
     args = get_arguments_parser().parse_args()
 
     geometry = Geometry.from_poscar(args.infile)
-    new_geometry = geometry.change_interslab_distance(args.vacuum)
 
     if args.selective:
-        new_geometry.selective_dynamics = numpy.ones((len(new_geometry), 3), dtype=bool)
+        geometry.selective_dynamics = numpy.ones((len(geometry), 3), dtype=bool)
+
+    if args.freeze_bottom > 0:
+        try:
+            geometry = geometry.freeze_layers(list(range(args.freeze_bottom)), tolerance=args.tolerance)
+        except ValueError as e:
+            print('error:', e, file=sys.stderr)
+            sys.exit(1)
+
+    if args.series is None:
+        geometry.change_interslab_distance(args.vacuum).to_poscar(args.poscar, direct=not args.cartesian)
+        return
+
+    # create one directory per distance, with the other inputs (if any) copied from the current directory
+    for distance, new_geometry in zip(args.series, geometry.change_interslab_distances(args.series)):
+        directory = pathlib.Path(args.directory_format.format(distance))
+        directory.mkdir(exist_ok=True)
+
+        with (directory / 'POSCAR').open('w') as f:
+            new_geometry.to_poscar(f, direct=not args.cartesian)
+
+        for p in SERIES_INPUT_FILES:
+            if pathlib.Path(p).exists():
+                shutil.copy(p, directory / p)
 
-    new_geometry.to_poscar(args.poscar, direct=not args.cartesian)
+        print(directory)
 
 
 if __name__ == '__main__':
@@ -3,22 +3,29 @@ Convert a XYZ file to a VASP geometry
 """
 
 import argparse
+import io
 import sys
 import numpy
 
-from ec_interface.molecular_geometry import MolecularGeometry
-from ec_interface.scripts import get_lattice, get_vec
+from ec_interface.molecular_geometry import MolecularGeometry, XYZTrajectory
+from ec_interface.scripts import get_lattice, get_vec, get_slice
 
 
 def get_arguments_parser():
     parser = argparse.ArgumentParser(description=__doc__)
 
-    parser.add_argument('infile', help='source interface', type=argparse.FileType('r'))
+    parser.add_argument('infile', help='source interface', type=argparse.FileType('rb'))
 
     parser.add_argument('-l', '--lattice', help='lattice vector size', type=get_lattice, default='10,10,10')
     parser.add_argument('-s', '--shift', help='Shift positions', type=get_vec, default='0,0,0')
     parser.add_argument('--sort', help='sort atoms', action='store_true')
 
+    parser.add_argument(
+        '-f', '--frames', type=get_slice,
+        help='Convert the frames of a trajectory, as `start:stop:step` (one output per frame, see `--output-format`)')
+    parser.add_argument(
+        '-O', '--output-format', default='POSCAR_{}', help='Format of the output files (with the index of the frame)')
+
     parser.add_argument('-o', '--poscar', type=argparse.FileType('w'), default=sys.stdout)
     parser.add_argument('-C', '--cartesian', action='store_true', help='Output in cartesian coordinates')
     parser.add_argument('-S', '--selective', action='store_true', help='Use selective dynamics in output')
@@ -26,16 +33,29 @@ def get_arguments_parser():
     return parser
 
 
-def main():
-    args = get_arguments_parser().parse_args()
-
-    geometry = MolecularGeometry.from_xyz(args.infile)
-    new_geometry = geometry.to_vasp(lattice_vectors=args.lattice, sort=args.sort, shift_positions=args.shift)
+def convert(geometry: MolecularGeometry, args: argparse.Namespace, title: str = '') -> str:
+    new_geometry = geometry.to_vasp(
+        lattice_vectors=args.lattice, title=title, sort=args.sort, shift_positions=args.shift)
 
     if args.selective:
         new_geometry.selective_dynamics = numpy.ones((len(new_geometry), 3), dtype=bool)
 
-    new_geometry.to_poscar(args.poscar, direct=not args.cartesian)
+    return new_geometry.as_poscar(direct=not args.cartesian)
+
+
+def main():
+    args = get_arguments_parser().parse_args()
+
+    if args.frames is None:
+        geometry = MolecularGeometry.from_xyz(io.TextIOWrapper(args.infile))
+        args.poscar.write(convert(geometry, args))
+        return
+
+    # convert frames of a trajectory, one at a time
+    trajectory = XYZTrajectory(args.infile)
+    for i, geometry in zip(trajectory.indices(args.frames), trajectory.frames(args.frames)):
+        with open(args.output_format.format(i), 'w') as f:
+            f.write(convert(geometry, args, title='frame {}'.format(i)))
 
 
 if __name__ == '__main__':
@@ -3,15 +3,16 @@ from numpy.typing import NDArray
 
 from typing import List, TextIO, Dict, Tuple, Optional
 
+from ec_interface.cell_list import CellList
+
 
 def get_zvals(f: TextIO) -> Dict[str, float]:
-    """Extract the number of valence electron in a POTCAR file
+    """Extract the number of valence electron in a POTCAR file (which is read line by line)
     """
-    lines = f.readlines()
     zvals = {}
 
     current_element = None
-    for line in lines:
+    for line in f:
         if 'VRHFIN' in line:
             current_element = line[line.find('=') + 1:line.find(':')]
         if 'ZVAL' in line:
@@ -50,7 +51,25 @@ def count_ions(symbols: List[str]) -> Tuple[List[str], List[int]]:
     return ions_types, ions_numbers
 
 
+class OverlapError(Exception):
+    def __init__(self, i: NDArray, j: NDArray, distances: NDArray):
+        super().__init__('{} pair(s) of atoms are too close'.format(len(distances)))
+
+        self.i = i
+        self.j = j
+        self.distances = distances
+
+
 class Geometry:
+    """A VASP geometry.
+    Positions are not copied, and the other kind of coordinates (direct or cartesian) is only computed when needed.
+    """
+
+    __slots__ = (
+        'title', 'lattice_vectors', 'ion_types', 'ion_numbers', 'selective_dynamics',
+        '_species', '_species_key', '_cartesian', '_direct'
+    )
+
     def __init__(
         self,
         title: str,
@@ -67,19 +86,44 @@ class Geometry:
         self.ion_numbers = ion_numbers
         self.selective_dynamics = selective_dynamics
 
-        self.ions = []
-        for ion_type, ion_number in zip(ion_types, ion_numbers):
-            self.ions.extend([ion_type] * ion_number)
+        self._species = None
+        self._species_key = None
 
-        self._cartesian_coordinates = None
-        self._direct_coordinates = None
+        self._cartesian = None
+        self._direct = None
 
         if is_direct:
-            self._direct_coordinates = positions.copy()
-            self._cartesian_coordinates = numpy.einsum('ij,jk->ik', positions, self.lattice_vectors)
+            self._direct = positions
         else:
-            self._cartesian_coordinates = positions.copy()
-            self._direct_coordinates = numpy.einsum('ij,jk->ik', positions, numpy.linalg.inv(self.lattice_vectors))
+            self._cartesian = positions
+
+    @property
+    def species(self) -> NDArray:
+        """Type of each ion, as an index in `ion_types`.
+        Cached, but computed again if `ion_numbers` changes.
+        """
+
+        key = tuple(self.ion_numbers)
+        if key != self._species_key:
+            self._species = numpy.repeat(numpy.arange(len(key), dtype=numpy.int32), key)
+            self._species_key = key
+
+        return self._species
+
+    @property
+    def ions(self) -> List[str]:
+        """Symbol of each ion
+        """
+
+        return [self.ion_types[i] for i in self.species]
+
+    @property
+    def _cartesian_coordinates(self) -> numpy.ndarray:
+        return self.cartesian_coordinates()
+
+    @property
+    def _direct_coordinates(self) -> numpy.ndarray:
+        return self.direct_coordinates()
 
     def __len__(self):
         return sum(self.ion_numbers)
@@ -100,17 +144,23 @@ class Geometry:
 
         if direct:
             r += 'Direct\n'
-            p = self._direct_coordinates
+            p = self.direct_coordinates()
         else:
             r += 'Carthesian\n'
-            p = self._cartesian_coordinates
+            p = self.cartesian_coordinates()
+
+        # format all lines at once
+        line_format = '{: 16.12f} {: 16.12f} {: 16.12f}'
+        values = [p]
 
-        for i in range(len(self)):
-            r += '{: 16.12f} {: 16.12f} {: 16.12f}'.format(*p[i])
-            if self.selective_dynamics is not None:
-                r += ' {} {} {}'.format(*('T' if x else 'F' for x in self.selective_dynamics[i]))
+        if self.selective_dynamics is not None:
+            line_format += ' {} {} {}'
+            values.append(numpy.where(self.selective_dynamics, 'T', 'F'))
 
-            r += ' {}\n'.format(self.ions[i])
+        line_format += ' {}\n'
+        values.append(numpy.array(self.ion_types, dtype=object)[self.species, numpy.newaxis])
+
+        r += (line_format * len(self)).format(*numpy.hstack([v.astype(object) for v in values]).ravel())
 
         return r
 
@@ -138,22 +188,18 @@ class Geometry:
         else:
             is_direct = line == 'd'
 
-        # get geometry
-        geometry = []
-        selective_dynamics = []
-        line = f.readline()
-        for i in range(sum(ion_numbers)):
-            chunks = line.split()
-            geometry.append([float(x) for x in chunks[:3]])
-            if is_selective_dynamics:
-                selective_dynamics.append([x == 'T' for x in chunks[3:6]])
-
-            line = f.readline()
+        # get geometry, parsed in a single block
+        lines = [f.readline() for _ in range(sum(ion_numbers))]
+        f.readline()  # skip the line after the geometry, e.g., the blank line separating the geometry from the data
 
-        positions = numpy.array(geometry)
+        positions = numpy.zeros((0, 3))
         selective_dynamics_arr = None
-        if is_selective_dynamics:
-            selective_dynamics_arr = numpy.array(selective_dynamics, dtype=bool)
+
+        if len(lines) > 0:
+            positions = numpy.loadtxt(lines, usecols=(0, 1, 2), comments=None, ndmin=2)
+            if is_selective_dynamics:
+                selective_dynamics_arr = numpy.loadtxt(
+                    lines, usecols=(3, 4, 5), dtype='U1', comments=None, ndmin=2) == 'T'
 
         return cls(
             title,
@@ -169,13 +215,28 @@ class Geometry:
         """Convert to cartesian coordinates if any
         """
 
-        return self._cartesian_coordinates
+        if self._cartesian is None:
+            self._cartesian = self._direct @ self.lattice_vectors
+
+        return self._cartesian
 
     def direct_coordinates(self) -> numpy.ndarray:
-        """Convert to cartesian coordinates if any
+        """Convert to direct coordinates if any
+        """
+
+        if self._direct is None:
+            self._direct = numpy.linalg.solve(self.lattice_vectors.T, self._cartesian.T).T
+
+        return self._direct
+
+    def same_cell(self, other: 'Geometry') -> bool:
+        """Check that `other` has the same lattice vectors and the same ions (types and numbers), so that grids
+        defined on both cells can be compared point by point (possibly after resampling)
         """
 
-        return self._direct_coordinates
+        return numpy.allclose(self.lattice_vectors, other.lattice_vectors) \
+            and list(self.ion_types) == list(other.ion_types) \
+            and list(self.ion_numbers) == list(other.ion_numbers)
 
     def interslab_distance(self) -> float:
         """Assume that the geometry is a slab and compute the interslab distance
@@ -195,39 +256,157 @@ class Geometry:
         """Assume that the geometry is a slab (along z) and change interslab distance (c axis).
         """
 
-        z_positions = self.cartesian_coordinates()[:, 2]
+        return self.change_interslab_distances([d], direct=direct)[0]
+
+    def change_interslab_distances(self, distances: List[float], direct: bool = True) -> List['Geometry']:
+        """Same as `change_interslab_distance()`, but for a series of interslab `distances`, which are all computed
+        at once.
+        """
 
-        # set at zero:
-        z_positions -= numpy.min(z_positions)
+        distances = numpy.asarray(distances, dtype=float)
+        z_positions = self.cartesian_coordinates()[:, 2]
 
-        # get slab size
+        # set at zero, and get slab size
+        z_positions = z_positions - numpy.min(z_positions)
         slab_size = numpy.max(z_positions)
 
-        # get corresponding lattice_vector
-        z_lattice_norm = slab_size + d
+        # get corresponding lattice vectors
+        z_lattice_norms = slab_size + distances
+
+        new_lattice_vectors = numpy.repeat(self.lattice_vectors[numpy.newaxis], len(distances), axis=0)
+        new_lattice_vectors[:, 2] = 0
+        new_lattice_vectors[:, 2, 2] = z_lattice_norms
 
-        # re-center slab
-        z_positions += d / 2
+        # re-center slab, for all distances at once
+        new_z_positions = z_positions + distances[:, numpy.newaxis] / 2
 
-        # create a new geometry
         if direct:
-            p = self._direct_coordinates.copy()
-            p[:, 2] = z_positions / z_lattice_norm
+            positions = numpy.repeat(self.direct_coordinates()[numpy.newaxis], len(distances), axis=0)
+            positions[:, :, 2] = new_z_positions / z_lattice_norms[:, numpy.newaxis]
         else:
-            p = self._cartesian_coordinates.copy()
-            p[:, 2] = z_positions
+            positions = numpy.repeat(self.cartesian_coordinates()[numpy.newaxis], len(distances), axis=0)
+            positions[:, :, 2] = new_z_positions
+
+        # create new geometries
+        return [
+            Geometry(
+                self.title,
+                new_lattice_vectors[i],
+                self.ion_types,
+                self.ion_numbers,
+                positions[i],
+                is_direct=direct,
+                selective_dynamics=self.selective_dynamics
+            ) for i in range(len(distances))
+        ]
+
+    def cell_height(self) -> float:
+        """Height of the cell along the normal to the slab (i.e., to the plane of the first two lattice vectors)
+        """
+
+        return abs(numpy.linalg.det(self.lattice_vectors)) / numpy.linalg.norm(
+            numpy.cross(self.lattice_vectors[0], self.lattice_vectors[1]))
+
+    def layers(self, tolerance: float = .5) -> NDArray:
+        """Assume that the geometry is a slab (along z) and group atoms in layers: consecutive atoms belong to the
+        same layer if they are less than `tolerance` (in Å) apart along the normal to the slab.
+        Since the cell is periodic, the slab is cut in the largest gap (i.e., the vacuum), and layers are numbered
+        from the bottom (0) to the top of the slab. Returns the layer of each atom.
+        """
+
+        if len(self) == 0:
+            return numpy.zeros(0, dtype=int)
+
+        height = self.cell_height()
+        z_positions = (self.direct_coordinates()[:, 2] % 1.) * height
+        order = numpy.argsort(z_positions, kind='stable')
+        gaps = numpy.diff(z_positions[order], append=z_positions[order[0]] + height)
+
+        # start right after the largest gap, so that the last gap is the one between periodic images
+        start = (numpy.argmax(gaps) + 1) % len(self)
+        order = numpy.roll(order, -start)
+        gaps = numpy.roll(gaps, -start)
+
+        layers = numpy.empty(len(self), dtype=int)
+        layers[order] = numpy.concatenate([[0], numpy.cumsum(gaps[:-1] > tolerance)])
+
+        return layers
+
+    def freeze_layers(self, layers: List[int], tolerance: float = .5) -> 'Geometry':
+        """Get a new geometry in which the atoms belonging to `layers` (see `layers()`, negative indices count from
+        the top) are frozen (`F F F`) with selective dynamics. Other atoms keep their selective dynamics, if any.
+        Raises `ValueError` if one of `layers` does not exist.
+        """
 
-        new_lattice_vectors = self.lattice_vectors.copy()
-        new_lattice_vectors[2] = [.0, .0, z_lattice_norm]
+        atom_layers = self.layers(tolerance)
+        num_layers = atom_layers.max() + 1 if len(self) > 0 else 0
+
+        layers = numpy.asarray(layers, dtype=int)
+        if numpy.any((layers < -num_layers) | (layers >= num_layers)):
+            raise ValueError('cannot freeze layers {}, only {} layers were found (tolerance: {:.2f} Å)'.format(
+                layers.tolist(), num_layers, tolerance))
+
+        frozen = numpy.isin(atom_layers, layers % max(num_layers, 1))
+
+        if self.selective_dynamics is not None:
+            selective_dynamics = self.selective_dynamics.copy()
+        else:
+            selective_dynamics = numpy.ones((len(self), 3), dtype=bool)
+
+        selective_dynamics[frozen] = False
 
         return Geometry(
             self.title,
-            new_lattice_vectors,
+            self.lattice_vectors.copy(),
             self.ion_types,
             self.ion_numbers,
-            p,
-            is_direct=direct,
-            selective_dynamics=self.selective_dynamics
+            self.direct_coordinates(),
+            is_direct=True,
+            selective_dynamics=selective_dynamics
+        )
+
+    def make_supercell(self, matrix: NDArray) -> 'Geometry':
+        """Create a supercell, of which the lattice vectors are `matrix @ lattice_vectors`, with `matrix` either an
+        integer, 3 integers (diagonal matrix), or a 3x3 integer matrix.
+        Ions stay grouped by type (images of an ion follow each other), and selective dynamics is kept if any.
+        """
+
+        matrix = numpy.asarray(matrix, dtype=int)
+        if matrix.ndim < 2:
+            matrix = numpy.diag(numpy.broadcast_to(matrix, (3,)))
+
+        if matrix.shape != (3, 3):
+            raise ValueError('invalid supercell matrix')
+
+        num_images = int(round(abs(numpy.linalg.det(matrix))))
+        if num_images == 0:
+            raise ValueError('invalid supercell matrix')
+
+        # lattice points (in the old cell) that are within the supercell
+        inv_matrix = numpy.linalg.inv(matrix)
+        corners = numpy.array(numpy.meshgrid([0, 1], [0, 1], [0, 1], indexing='ij')).reshape(3, -1).T @ matrix
+        ranges = [numpy.arange(corners[:, i].min(), corners[:, i].max() + 1) for i in range(3)]
+        candidates = numpy.array(numpy.meshgrid(*ranges, indexing='ij')).reshape(3, -1).T
+
+        in_supercell = candidates @ inv_matrix
+        offsets = candidates[numpy.all((in_supercell > -1e-8) & (in_supercell < 1 - 1e-8), axis=1)]
+        assert len(offsets) == num_images
+
+        # all images at once, so that images of each ion follow each other
+        positions = ((self.direct_coordinates()[:, numpy.newaxis] + offsets) @ inv_matrix).reshape(-1, 3)
+
+        selective_dynamics = None
+        if self.selective_dynamics is not None:
+            selective_dynamics = numpy.repeat(self.selective_dynamics, num_images, axis=0)
+
+        return Geometry(
+            self.title,
+            matrix @ self.lattice_vectors,
+            self.ion_types.copy(),
+            [n * num_images for n in self.ion_numbers],
+            positions,
+            is_direct=True,
+            selective_dynamics=selective_dynamics
         )
 
     def nelect(self, f: TextIO) -> float:
@@ -241,16 +420,69 @@ class Geometry:
 
         return nelect
 
-    def merge_with(self, other: 'Geometry', title: str = '', shift: Optional[NDArray] = None) -> 'Geometry':
+    def cell_list(self, cutoff: float) -> CellList:
+        """Get a periodic cell list of the atoms, to find neighbours within `cutoff`
+        """
 
-        # shift `additional` if any
-        if shift is not None:
-            c = other._cartesian_coordinates + shift
-        else:
-            c = other._cartesian_coordinates
+        return CellList(self.lattice_vectors, self.cartesian_coordinates(), cutoff)
+
+    def close_contacts(self, cutoff: float) -> Tuple[NDArray, NDArray, NDArray]:
+        """Find all pairs of atoms `(i, j)` (with `i < j`) that are within `cutoff` of each other,
+        including periodic images. Returns `i`, `j`, and the corresponding distances.
+        """
+
+        return self.cell_list(cutoff).pairs()
+
+    def merge_with(
+        self,
+        other: 'Geometry',
+        title: str = '',
+        shift: Optional[NDArray] = None,
+        min_distance: Optional[float] = None
+    ) -> 'Geometry':
+        """Merge `other` into this geometry (using the lattice vectors of the latter).
+        If `min_distance` is given, raise `OverlapError` if an atom of `other` is within `min_distance` of an atom
+        of this geometry (`i` refers to atoms of `other`, and `j` to atoms of this geometry).
+        """
+
+        shift = numpy.zeros(3) if shift is None else numpy.asarray(shift, dtype=float)
+
+        # check overlaps, if any
+        if min_distance is not None and len(self) > 0 and len(other) > 0:
+            i, j, d = self.cell_list(min_distance).query(other.cartesian_coordinates() + shift)
+            if len(d) > 0:
+                raise OverlapError(i, j, d)
+
+        return self.merge_with_many(other, shift[numpy.newaxis], title=title)[0][0]
+
+    def merge_with_many(
+        self,
+        other: 'Geometry',
+        shifts: NDArray,
+        title: str = '',
+        min_distance: Optional[float] = None
+    ) -> Tuple[List['Geometry'], NDArray]:
+        """Merge `other` into this geometry (see `merge_with()`) for each shift in `shifts` (of shape `(n, 3)`),
+        all at once. If `min_distance` is given, the placements for which an atom of `other` is within
+        `min_distance` of an atom of this geometry are discarded.
+        Returns the merged geometries and, for each of them, the index of the corresponding shift.
+        """
+
+        shifts = numpy.asarray(shifts, dtype=float).reshape(-1, 3)
+        kept = numpy.arange(len(shifts))
+
+        # positions of `other`, for all shifts
+        c = other.cartesian_coordinates()[numpy.newaxis] + shifts[:, numpy.newaxis]
+
+        # check overlaps (for all placements at once), if any
+        if min_distance is not None and len(self) > 0 and len(other) > 0:
+            i, _, _ = self.cell_list(min_distance).query(c.reshape(-1, 3))
+            kept = numpy.setdiff1d(kept, i // len(other))
+            c = c[kept]
 
         # merge position, ion types and numbers.
-        positions = numpy.vstack([self._cartesian_coordinates, c])
+        positions = numpy.concatenate(
+            [numpy.broadcast_to(self.cartesian_coordinates(), (len(kept), len(self), 3)), c], axis=1)
         ion_types = self.ion_types.copy() + other.ion_types.copy()
         ion_numbers = self.ion_numbers.copy() + other.ion_numbers.copy()
 
@@ -265,12 +497,14 @@ class Geometry:
                 if other.selective_dynamics is not None else numpy.ones((len(other), 3), dtype=bool)
             ])
 
-        return Geometry(
-            title,
-            lattice_vectors=self.lattice_vectors.copy(),
-            ion_types=ion_types,
-            ion_numbers=ion_numbers,
-            positions=positions,
-            is_direct=False,
-            selective_dynamics=selective_dynamics
-        )
+        return [
+            Geometry(
+                title,
+                lattice_vectors=self.lattice_vectors.copy(),
+                ion_types=ion_types,
+                ion_numbers=ion_numbers,
+                positions=positions[k],
+                is_direct=False,
+                selective_dynamics=selective_dynamics
+            ) for k in range(len(kept))
+        ], kept
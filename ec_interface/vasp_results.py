@@ -1,13 +1,236 @@
+import io
 import pathlib
 import h5py
 import numpy
 
 from numpy.typing import NDArray
-from typing import TextIO
+from typing import Iterable, Iterator, NamedTuple, Optional, TextIO, Tuple
 
 from ec_interface.vasp_geometry import Geometry
 
 
+GRID_VALUES_PER_LINE = 5
+GRID_FORMAT = '% .10e'
+
+HDF5_SUFFIXES = ('.h5', '.hdf5')
+
+
+def is_hdf5(path: pathlib.Path) -> bool:
+    """Check whether `path` is a HDF5 file, from its suffix"""
+
+    return pathlib.Path(path).suffix in HDF5_SUFFIXES
+
+
+def split_grid_spec(spec: str) -> Tuple[pathlib.Path, Optional[str]]:
+    """Split `spec`, which is either a path or `archive.h5:dataset`, into a path and a dataset (`None` for a path)
+    """
+
+    path, _, dataset = spec.partition(':')
+    if dataset != '' and is_hdf5(path):
+        return pathlib.Path(path), dataset
+
+    return pathlib.Path(spec), None
+
+
+class GridInfo(NamedTuple):
+    """Header of a grid file, i.e., the geometry and the size of the grid (`None` if the file only contains a
+    geometry, e.g., a POSCAR), and the position of the values in the file (`None` if the file is not seekable)
+    """
+
+    geometry: Geometry
+    grid_size: Optional[Tuple[int, int, int]]
+    data_offset: Optional[int]
+
+    def spacing(self) -> NDArray:
+        """Get the distance (in Å) between two points of the grid, along each lattice vector
+        """
+
+        return numpy.linalg.norm(self.geometry.lattice_vectors, axis=1) / self.grid_size
+
+
+def read_grid_header(f: TextIO) -> Tuple[Geometry, Tuple[int, int, int]]:
+    """Read the geometry and the size of the grid that precede the values of a grid file
+    """
+
+    info = VaspResultGrid.read_header(f)
+    if info.grid_size is None:
+        raise ValueError('not a grid file (no grid size after the geometry)')
+
+    return info.geometry, info.grid_size
+
+
+def read_grid_blocks(f: TextIO, grid_size: Tuple[int, int, int], num_planes: int = 1) -> Iterator[NDArray]:
+    """Read the values of a grid (the header being already read, see `read_grid_header()`), by blocks of
+    `num_planes` z-planes. Each block is of shape `(nx, ny, num_planes)` (except the last one, which can be smaller).
+    Lines are read as needed, so that only one block is in memory at a time.
+    """
+
+    plane_size = grid_size[0] * grid_size[1]
+    carry = numpy.zeros(0)
+
+    for z_start in range(0, grid_size[2], num_planes):
+        num_block_planes = min(num_planes, grid_size[2] - z_start)
+        num_values = num_block_planes * plane_size
+
+        # read the lines that contain the missing values, and keep the rest for the next block
+        num_lines = int(numpy.ceil((num_values - len(carry)) / GRID_VALUES_PER_LINE))
+        values = numpy.concatenate([carry, numpy.fromstring(
+            ''.join(f.readline() for _ in range(num_lines)), sep=' ')])
+
+        if len(values) < num_values:
+            raise ValueError('grid file is truncated')
+
+        carry = values[num_values:]
+
+        # data are stored in the format (Z, Y, X), so it is reversed here:
+        yield values[:num_values].reshape((num_block_planes, grid_size[1], grid_size[0])).T
+
+
+def write_grid_blocks(f: TextIO, geometry: Geometry, grid_size: Tuple[int, int, int], blocks: Iterable[NDArray]):
+    """Write a grid file, with `blocks` of z-planes (of shape `(nx, ny, n)`) written as soon as they are available.
+    The result is the same as `VaspResultGrid.to_file()`, i.e., the last line is padded with zeros.
+    """
+
+    geometry.to_poscar(f)
+
+    f.write('\n {:4} {:4} {:4}\n'.format(*grid_size))
+
+    carry = numpy.zeros(0)
+    for block in blocks:
+        values = numpy.concatenate([carry, block.T.ravel()])
+
+        # write complete lines, and keep the rest for the next block
+        num_complete = len(values) - len(values) % GRID_VALUES_PER_LINE
+        numpy.savetxt(f, values[:num_complete].reshape((-1, GRID_VALUES_PER_LINE)), fmt=GRID_FORMAT)
+        carry = values[num_complete:]
+
+    if len(carry) > 0:
+        last_line = numpy.zeros((1, GRID_VALUES_PER_LINE))
+        last_line[0, :len(carry)] = carry
+        numpy.savetxt(f, last_line, fmt=GRID_FORMAT)
+
+    # `numpy.savetxt()` keeps a reference to `f` in a cycle, which might not be collected (thus flushed) at exit
+    f.flush()
+
+
+def write_grid_dataset(
+    group: h5py.Group, name: str, geometry: Geometry, grid_size: Tuple[int, int, int], blocks: Iterable[NDArray],
+    num_planes: int = 1, compression: Optional[str] = None
+) -> h5py.Dataset:
+    """Write the `name` dataset of `group`, with `blocks` of z-planes written as soon as they are available.
+    The dataset is chunked by `num_planes` z-planes, possibly compressed with `compression` (e.g., `'gzip'`, which is
+    lossless), and the geometry is stored as a POSCAR (`geometry` attribute).
+    """
+
+    dset = group.create_dataset(
+        name,
+        shape=grid_size,
+        dtype=float,
+        chunks=(grid_size[0], grid_size[1], min(num_planes, grid_size[2])),
+        compression=compression,
+        shuffle=compression is not None
+    )
+
+    dset.attrs['version'] = 1
+    dset.attrs['geometry'] = geometry.as_poscar()
+
+    z_start = 0
+    for block in blocks:
+        if block.shape[:2] != tuple(grid_size[:2]) or z_start + block.shape[2] > grid_size[2]:
+            raise ValueError('block of shape {} does not fit in a grid of {}'.format(block.shape, tuple(grid_size)))
+
+        dset[:, :, z_start:z_start + block.shape[2]] = block
+        z_start += block.shape[2]
+
+    if z_start != grid_size[2]:
+        raise ValueError('only {} z-planes out of {} were written'.format(z_start, grid_size[2]))
+
+    return dset
+
+
+def write_grid_blocks_hdf5(
+    path: pathlib.Path, geometry: Geometry, grid_size: Tuple[int, int, int], blocks: Iterable[NDArray],
+    name: str = 'grid', mode: str = 'w'
+):
+    """Same as `write_grid_blocks()`, but in the `name` dataset of a HDF5 file (see `write_grid_dataset()`), opened
+    with `mode` (use `'a'` to add a dataset to an existing file)
+    """
+
+    with h5py.File(path, mode) as f:
+        write_grid_dataset(f, name, geometry, grid_size, blocks)
+
+
+class GridSource:
+    """Grid that is read by blocks of z-planes, either from a grid file (e.g., `CHGCAR`), or from the `dataset` of
+    a HDF5 file (e.g., an archive made by `ei-archive`). The header is read when entering the context.
+    """
+
+    def __init__(self, path: pathlib.Path, dataset: Optional[str] = None):
+        self.path = pathlib.Path(path)
+        self.dataset = dataset
+
+        self.geometry = None
+        self.grid_size = None
+
+        self._f = None
+        self._dset = None
+
+    @classmethod
+    def from_spec(cls, spec: str) -> 'GridSource':
+        """Get a source from `spec`, which is either a path to a grid file or `archive.h5:dataset`
+        """
+
+        return cls(*split_grid_spec(spec))
+
+    def __str__(self) -> str:
+        return str(self.path) if self.dataset is None else '{}:{}'.format(self.path, self.dataset)
+
+    def __enter__(self) -> 'GridSource':
+        if not self.path.exists():
+            raise FileNotFoundError('file `{}` does not exists'.format(self.path))
+
+        if self.dataset is None:
+            self._f = self.path.open()
+        else:
+            self._f = h5py.File(self.path, 'r')
+
+        try:
+            if self.dataset is None:
+                self.geometry, self.grid_size = read_grid_header(self._f)
+            else:
+                if self.dataset not in self._f:
+                    raise FileNotFoundError('no dataset `{}` in `{}`'.format(self.dataset, self.path))
+
+                self._dset = self._f[self.dataset]
+                self.geometry = Geometry.from_poscar(io.StringIO(self._dset.attrs['geometry']))
+                self.grid_size = self._dset.shape
+        except BaseException:
+            self._f.close()
+            raise
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._f.close()
+
+    def blocks(self, num_planes: int = 1) -> Iterator[NDArray]:
+        """Read the values by blocks of `num_planes` z-planes (see `read_grid_blocks()`).
+        For a HDF5 file, only the corresponding slices of the dataset are read.
+        """
+
+        if self._dset is None:
+            yield from read_grid_blocks(self._f, self.grid_size, num_planes)
+        else:
+            for z_start in range(0, self.grid_size[2], num_planes):
+                yield self._dset[:, :, z_start:z_start + num_planes]
+
+    def read(self) -> 'VaspResultGrid':
+        """Read all values at once
+        """
+
+        return VaspResultGrid(self.geometry, next(self.blocks(self.grid_size[2])))
+
+
 class VaspResultsH5:
     def __init__(self, nelect: float, free_energy: float, fermi_energy: float):
         self.nelect = nelect
@@ -25,10 +248,55 @@ class VaspResultsH5:
 
 
 class PlanarAverage:
-    """Stores a  planar average"""
+    """Stores a  planar average, with `length` the length (in Å) of the axis"""
 
-    def __init__(self, values: NDArray):
+    def __init__(self, values: NDArray, length: float = 1.):
         self.values = values
+        self.length = length
+
+    def positions(self) -> NDArray:
+        """Get the position (in Å) of each value along the axis
+        """
+
+        return numpy.arange(len(self.values)) / len(self.values) * self.length
+
+    def macroscopic_average(self, period: float, period2: Optional[float] = None) -> 'PlanarAverage':
+        """Get the macroscopic average, i.e., the convolution (with periodic boundaries) with a window function of
+        width `period` (in Å), and then with a second one of width `period2` if any (e.g., for interfaces between
+        two materials, see 10.1103/PhysRevLett.61.734). The convolution is performed in the Fourier space.
+        """
+
+        frequencies = numpy.fft.rfftfreq(len(self.values), d=self.length / len(self.values))
+
+        # the Fourier transform of a (normalized) window function is a sinc
+        kernel = numpy.sinc(frequencies * period)
+        if period2 is not None:
+            kernel *= numpy.sinc(frequencies * period2)
+
+        return PlanarAverage(
+            numpy.fft.irfft(numpy.fft.rfft(self.values) * kernel, n=len(self.values)), length=self.length)
+
+    def regions(self, thresholds: Iterable[float]) -> Tuple[NDArray, NDArray, NDArray, NDArray]:
+        """Split the axis in regions, delimited by the points where the values cross each threshold of `thresholds`
+        (for all thresholds at once), and sum the values in each region.
+        Returns, for each region, the index of its threshold, its first and last (excluded) indices, and the sum.
+        """
+
+        thresholds = numpy.asarray(thresholds, dtype=float)
+        n = len(self.values)
+
+        # a region starts at `i` if the values strictly cross the threshold between `i - 1` and `i`
+        signs = numpy.sign(self.values[numpy.newaxis, :] - thresholds[:, numpy.newaxis])
+        boundaries = numpy.ones((len(thresholds), n + 1), dtype=bool)
+        boundaries[:, 1:n] = signs[:, :-1] * signs[:, 1:] < 0
+
+        threshold_index, positions = numpy.nonzero(boundaries)
+        same = threshold_index[:-1] == threshold_index[1:]
+        starts, ends = positions[:-1][same], positions[1:][same]
+
+        cumulative = numpy.concatenate([[.0], numpy.cumsum(self.values)])
+
+        return threshold_index[:-1][same], starts, ends, cumulative[ends] - cumulative[starts]
 
     def sum(self) -> float:
         return self.values.sum()
@@ -75,60 +343,136 @@ class VaspResultGrid:
         self.geometry = geometry
         self.grid_data = grid_data
 
+    @staticmethod
+    def read_header(f: TextIO) -> GridInfo:
+        """Read the header of a grid file (i.e., only the geometry and the size of the grid, not the values).
+        `f` is then positioned at the beginning of the values.
+        """
+
+        geometry = Geometry.from_poscar(f)
+
+        line = f.readline().split()
+        if len(line) != 3 or not all(x.isdigit() for x in line):
+            return GridInfo(geometry, None, None)
+
+        return GridInfo(geometry, tuple(int(x) for x in line), f.tell() if f.seekable() else None)
+
     @classmethod
     def from_file(cls, f: TextIO) -> 'VaspResultGrid':
-        geometry = Geometry.from_poscar(f)
+        geometry, grid_size = read_grid_header(f)
 
-        # get points
-        grid_size = tuple(int(x) for x in f.readline().split())
-        num_points = grid_size[0] * grid_size[1] * grid_size[2]
-        points = []
+        # get points, all at once
+        return cls(geometry, next(read_grid_blocks(f, grid_size, num_planes=grid_size[2])))
 
-        remaining_lines = f.readlines()
-        nlines = int(numpy.ceil(num_points / 5))
+    def to_file(self, f: TextIO) -> None:
+        write_grid_blocks(f, self.geometry, self.grid_data.shape, [self.grid_data])
 
-        for i in range(nlines):
-            points.extend(float(x) for x in remaining_lines[i].split())
+    @classmethod
+    def from_hdf5(cls, dset: h5py.Dataset) -> 'VaspResultGrid':
+        """Read a dataset written by `to_hdf5()` (or `write_grid_dataset()`)
+        """
 
-        # data are stored in the format (Z, Y, X), so it is reversed here:
-        grid_data = numpy.array(points).reshape(tuple(reversed(grid_size))).T
+        return cls(Geometry.from_poscar(io.StringIO(dset.attrs['geometry'])), dset[()])
 
-        return cls(geometry, grid_data)
+    def to_hdf5(
+        self, group: h5py.Group, name: str, num_planes: int = 1, compression: Optional[str] = 'gzip'
+    ) -> h5py.Dataset:
+        """Write the grid in the `name` dataset of `group`, chunked by blocks of `num_planes` z-planes and compressed
+        (see `write_grid_dataset()`)
+        """
 
-    def to_file(self, f: TextIO) -> None:
-        self.geometry.to_poscar(f)
+        return write_grid_dataset(
+            group, name, self.geometry, self.grid_data.shape, [self.grid_data], num_planes, compression)
+
+    def resample(self, grid_size: Tuple[int, int, int]) -> 'VaspResultGrid':
+        """Get the values on a grid of size `grid_size`, using Fourier interpolation (i.e., zero-padding or truncation
+        of the Fourier coefficients, the Nyquist frequency being dropped).
+        The average value (e.g., the number of electrons for a CHGCAR) is thus kept.
+        """
+
+        grid_size = tuple(grid_size)
+        old_size = self.grid_data.shape
 
-        f.write('\n {:4} {:4} {:4}\n'.format(*self.grid_data.shape))
+        if grid_size == old_size:
+            return VaspResultGrid(self.geometry, self.grid_data.copy())
 
-        # use numpy.savetxt() for the rest, as it is (wayyyyy!!) faster
-        num_points = self.grid_data.shape[0] * self.grid_data.shape[1] * self.grid_data.shape[2]
+        coefficients = numpy.fft.rfftn(self.grid_data)
+        new_coefficients = numpy.zeros((grid_size[0], grid_size[1], grid_size[2] // 2 + 1), dtype=complex)
 
-        num_lines = int(numpy.ceil(num_points / 5))
+        # keep frequencies that exist in both grids, for the two first axes (positive and negative frequencies) ...
+        kept = [(min(n, m) - 1) // 2 for n, m in zip(old_size, grid_size)]
+        slices = [
+            [slice(0, kept[i] + 1), slice(-kept[i], None) if kept[i] > 0 else slice(0, 0)] for i in range(2)
+        ]
 
-        data_to_write = numpy.zeros(num_lines * 5)
-        data_to_write[0:num_points] = self.grid_data.T.ravel()
-        data_to_write = data_to_write.reshape((num_lines, 5))
+        # ... and for the last one (only positive frequencies)
+        for slice_x in slices[0]:
+            for slice_y in slices[1]:
+                new_coefficients[slice_x, slice_y, :kept[2] + 1] = coefficients[slice_x, slice_y, :kept[2] + 1]
 
-        numpy.savetxt(f, data_to_write, fmt='% .10e')
+        # (`irfftn()` divides by the new number of points, while coefficients were obtained with the old one)
+        new_data = numpy.fft.irfftn(new_coefficients, s=grid_size, axes=(0, 1, 2))
+        new_data *= numpy.prod(grid_size) / numpy.prod(old_size)
+
+        return VaspResultGrid(self.geometry, new_data)
 
     def planar_average(self, axis: int) -> PlanarAverage:
+        """Get an average of the value over the planes spanned by the two other lattice vectors, along `axis`.
+        The length of the planar average is the distance between those planes (i.e., the height of the cell), which is
+        correct for non-orthogonal cells as well.
+        """
+
+        other_axes = tuple(i for i in range(3) if i != axis)
+        lattice_vectors = self.geometry.lattice_vectors
+
+        return PlanarAverage(
+            self.grid_data.mean(axis=other_axes),
+            length=abs(numpy.linalg.det(lattice_vectors)) / numpy.linalg.norm(
+                numpy.cross(lattice_vectors[other_axes[0]], lattice_vectors[other_axes[1]]))
+        )
+
+    def miller_average(self, miller_indices: Tuple[int, int, int], num_bins: Optional[int] = None) -> PlanarAverage:
+        """Get an average of the value over the `(hkl)` lattice planes given by `miller_indices`, i.e., along the
+        normal to those planes. Grid points are binned by their position along that normal, all at once.
+        By default, there is one bin per distinct position (so that, e.g., `(001)` is the same as `planar_average(2)`),
+        but `num_bins` can be given.
+        The length of the planar average is the distance between two `(hkl)` planes.
+        """
+
+        miller_indices = numpy.asarray(miller_indices, dtype=int)
+        if numpy.all(miller_indices == 0):
+            raise ValueError('Miller indices cannot all be zero')
 
         shape = self.grid_data.shape
-        volume = numpy.prod(shape)
 
-        axis_avg = []
+        # distance between planes, from the corresponding reciprocal lattice vector
+        reciprocal_vectors = numpy.linalg.inv(self.geometry.lattice_vectors).T
+        spacing = 1 / numpy.linalg.norm(miller_indices @ reciprocal_vectors)
 
-        for i in range(shape[axis]):
-            if axis == 0:
-                avg = self.grid_data[i, :, :].sum()
-            elif axis == 1:
-                avg = self.grid_data[:, i, :].sum()
-            else:
-                avg = self.grid_data[:, :, i].sum()
+        # position of each grid point along the normal, as an integer fraction of `spacing`
+        # (`h * num_positions` is a multiple of `n`, so that the division is exact)
+        periods = [n // numpy.gcd(h, n) for h, n in zip(miller_indices, shape)]
+        num_positions = numpy.lcm.reduce(periods)
+
+        positions = sum(
+            ((miller_indices[i] * num_positions) // shape[i] * numpy.arange(shape[i])).reshape(
+                [-1 if j == i else 1 for j in range(3)])
+            for i in range(3)
+        ) % num_positions
+
+        if num_bins is None:
+            num_bins = num_positions
+
+        bins = numpy.broadcast_to(positions * num_bins // num_positions, shape).ravel()
+
+        sums = numpy.bincount(bins, weights=self.grid_data.ravel(), minlength=num_bins)
+        counts = numpy.bincount(bins, minlength=num_bins)
 
-            axis_avg.append(avg / (volume / shape[axis]))
+        if numpy.any(counts == 0):
+            raise ValueError(
+                'some of the {} bins are empty (there are only {} distinct positions)'.format(num_bins, num_positions))
 
-        return PlanarAverage(numpy.array(axis_avg))
+        return PlanarAverage(sums / counts, length=spacing)
 
     def xy_planar_average(self) -> PlanarAverage:
         """Get an average of the value along Z"""
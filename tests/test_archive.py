@@ -0,0 +1,100 @@
+import pathlib
+
+import h5py
+import numpy
+import pytest
+
+from ec_interface.ec_parameters import ECParameters
+from ec_interface.scripts.archive import archive_grids
+from ec_interface.vasp_results import GridSource, VaspResultGrid, write_grid_dataset
+
+from tests import DUMMY_POSCAR
+from tests.test_vasp_results import make_grid
+
+
+def test_archive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    parameters = ECParameters(21., .02, .02, step=.01)
+    grid = make_grid((3, 4, 5))
+
+    for n, directory in zip(parameters.steps(), parameters.directories(pathlib.Path('.'))):
+        directory.mkdir()
+        for name, factor in [('CHGCAR', n), ('LOCPOT', -n)]:
+            with (directory / name).open('w') as f:
+                VaspResultGrid(grid.geometry, grid.grid_data * factor).to_file(f)
+
+    archive_grids(parameters, pathlib.Path('grids.h5'), ['CHGCAR', 'LOCPOT'])
+
+    with h5py.File('grids.h5') as f:
+        dset = f['EC_21.010/CHGCAR']
+        assert dset.attrs['nelect'] == 21.01
+        assert dset.compression == 'gzip'
+        assert numpy.allclose(VaspResultGrid.from_hdf5(dset).grid_data, grid.grid_data * 21.01)
+
+    # same values from the archive and from the file, also by blocks
+    with GridSource.from_spec('grids.h5:EC_20.990/LOCPOT') as source_archive, \
+            GridSource.from_spec('EC_20.990/LOCPOT') as source_file:
+        assert source_archive.grid_size == source_file.grid_size == (3, 4, 5)
+        assert numpy.allclose(source_archive.geometry.lattice_vectors, source_file.geometry.lattice_vectors)
+
+        for block_archive, block_file in zip(source_archive.blocks(2), source_file.blocks(2)):
+            assert block_archive.shape == block_file.shape
+            assert numpy.allclose(block_archive, block_file)
+
+
+def test_grid_hdf5(tmp_path):
+    grid = make_grid((3, 4, 5))
+
+    with h5py.File(tmp_path / 'grid.h5', 'w') as f:
+        dset = grid.to_hdf5(f, 'grid', num_planes=2)
+        assert dset.chunks == (3, 4, 2)
+
+        grid_read = VaspResultGrid.from_hdf5(f['grid'])
+        assert numpy.array_equal(grid_read.grid_data, grid.grid_data)
+        assert numpy.allclose(grid_read.geometry.lattice_vectors, grid.geometry.lattice_vectors)
+
+        # blocks must exactly fill the grid
+        with pytest.raises(ValueError):
+            write_grid_dataset(f, 'missing', grid.geometry, (3, 4, 5), [grid.grid_data[:, :, :3]])
+
+        with pytest.raises(ValueError):
+            write_grid_dataset(f, 'too_many', grid.geometry, (3, 4, 5), [grid.grid_data, grid.grid_data[:, :, :1]])
+
+    with GridSource(tmp_path / 'grid.h5', 'grid') as source:
+        assert numpy.array_equal(source.read().grid_data, grid.grid_data)
+
+
+def test_grid_source_errors(tmp_path):
+    grid = make_grid((3, 4, 5))
+
+    with h5py.File(tmp_path / 'grid.h5', 'w') as f:
+        grid.to_hdf5(f, 'grid')
+
+    # missing file or dataset
+    with pytest.raises(FileNotFoundError):
+        GridSource(tmp_path / 'CHGCAR').__enter__()
+
+    source = GridSource(tmp_path / 'grid.h5', 'other')
+    with pytest.raises(FileNotFoundError):
+        source.__enter__()
+
+    assert not source._f.id.valid
+
+    # not a grid file, which is closed
+    (tmp_path / 'POSCAR').write_text(DUMMY_POSCAR)
+
+    source = GridSource(tmp_path / 'POSCAR')
+    with pytest.raises(ValueError):
+        source.__enter__()
+
+    assert source._f.closed
+
+    # `:` in a path that is not a HDF5 file
+    source = GridSource.from_spec(str(tmp_path / 'EC:1' / 'CHGCAR'))
+    assert source.path == tmp_path / 'EC:1' / 'CHGCAR'
+    assert source.dataset is None
+
+    source = GridSource.from_spec('{}:grid'.format(tmp_path / 'grid.h5'))
+    assert source.path == tmp_path / 'grid.h5'
+    assert source.dataset == 'grid'
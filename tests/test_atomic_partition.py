@@ -0,0 +1,55 @@
+import itertools
+
+import numpy
+import pytest
+
+from ec_interface.atomic_partition import AtomicPartition
+from ec_interface.vasp_geometry import Geometry
+from ec_interface.vasp_results import VaspResultGrid
+
+
+def make_slab() -> Geometry:
+    lattice_vectors = numpy.array([
+        [6., 0., 0.],
+        [2., 5., 0.],
+        [0., 0., 20.],
+    ])
+
+    positions = numpy.random.default_rng(42).random((12, 3)) * [1., 1., .3]
+    return Geometry('slab', lattice_vectors, ['Pt', 'O'], [8, 4], positions)
+
+
+@pytest.mark.parametrize('radii', [None, {'Pt': 1.4, 'O': .7}])
+def test_atomic_partition(radii):
+    geometry = make_slab()
+    grid_size = (13, 10, 42)
+
+    partition = AtomicPartition(geometry, grid_size, radii)
+
+    # brute force
+    points = numpy.stack(numpy.meshgrid(*(numpy.arange(n) / n for n in grid_size), indexing='ij'), axis=-1).reshape(
+        -1, 3) @ geometry.lattice_vectors
+    images = numpy.array(list(itertools.product(range(-2, 3), repeat=3))) @ geometry.lattice_vectors
+    positions = geometry.cartesian_coordinates()
+
+    distances = numpy.linalg.norm(
+        points[:, numpy.newaxis, numpy.newaxis] - positions[numpy.newaxis, :, numpy.newaxis] - images, axis=3
+    ).min(axis=2)
+
+    scores = distances ** 2 - partition.radii ** 2
+    assert numpy.allclose(
+        scores[numpy.arange(len(points)), partition.labels.ravel()], scores.min(axis=1))
+
+    # integrate
+    grid = VaspResultGrid(geometry, numpy.full(grid_size, 2.))
+    assert partition.matches(grid)
+
+    charges = partition.integrate(grid)
+    assert charges.sum() == pytest.approx(2.)
+    assert numpy.allclose(charges, numpy.bincount(partition.labels.ravel(), minlength=12) / numpy.prod(grid_size) * 2)
+
+    assert numpy.allclose(partition.per_species(charges), [charges[:8].sum(), charges[8:].sum()])
+    assert partition.per_layer(charges).sum() == pytest.approx(2.)
+
+    # another grid size
+    assert not partition.matches(VaspResultGrid(geometry, numpy.zeros((13, 10, 40))))
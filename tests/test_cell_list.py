@@ -0,0 +1,53 @@
+import itertools
+
+import numpy
+import pytest
+
+from ec_interface.cell_list import CellList
+
+
+def brute_force_pairs(lattice_vectors, positions, cutoff):
+    pairs = []
+    images = numpy.array(list(itertools.product(range(-3, 4), repeat=3))) @ lattice_vectors
+
+    for i in range(len(positions)):
+        for j in range(i + 1, len(positions)):
+            d = numpy.linalg.norm(positions[j] + images - positions[i], axis=1)
+            pairs.extend((i, j, x) for x in d[d <= cutoff])
+
+    return sorted(pairs)
+
+
+@pytest.mark.parametrize('cutoff', [1.5, 3.0, 6.0])
+def test_cell_list_pairs(cutoff):
+    lattice_vectors = numpy.array([
+        [6., 0., 0.],
+        [2., 5., 0.],
+        [.5, .5, 8.],
+    ])
+
+    positions = numpy.random.default_rng(42).random((60, 3)) @ lattice_vectors + 1.5  # some are outside the cell
+
+    cell_list = CellList(lattice_vectors, positions, cutoff)
+    assert len(cell_list) == 60
+
+    i, j, d = cell_list.pairs()
+    pairs = sorted(zip(i, j, d))
+    expected = brute_force_pairs(lattice_vectors, positions, cutoff)
+
+    assert len(pairs) == len(expected)
+    assert numpy.allclose(numpy.array(pairs), numpy.array(expected))
+
+
+def test_cell_list_query():
+    lattice_vectors = numpy.diag([10., 10., 10.])
+    positions = numpy.array([[.5, .5, .5], [5., 5., 5.]])
+
+    cell_list = CellList(lattice_vectors, positions, 2.0)
+
+    i, j, d = cell_list.query(numpy.array([[9.5, 9.5, 9.5], [5., 5., 6.5], [2.5, 2.5, 2.5]]))
+    assert sorted(zip(i, j)) == [(0, 0), (1, 1)]
+    assert sorted(d) == pytest.approx([1.5, numpy.sqrt(3)])
+
+    with pytest.raises(ValueError):
+        cell_list.query(positions, 3.0)
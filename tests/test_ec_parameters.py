@@ -61,3 +61,15 @@ def test_steps_ok():
     assert list(
         ECParameters(ne_zc=1.0, ne_added=0.2, ne_removed=0.2, step=0.1, additional=[1.1, 1.4, 0.7, 0.85, 1.4]).steps()
     ) == pytest.approx([0.7, 0.8, 0.85, 0.9, 1.0, 1.1, 1.2, 1.4])
+
+
+def test_chain_ok():
+    parameters = ECParameters(ne_zc=1.0, ne_added=0.2, ne_removed=0.1, step=0.1, additional=[1.05])
+    chain = list(parameters.chain())
+
+    assert [x[0] for x in chain] == pytest.approx([1.0, 1.05, 0.9, 1.1, 1.2])
+    assert chain[0][1] is None
+    assert [x[1] for x in chain[1:]] == pytest.approx([1.0, 1.0, 1.05, 1.1])
+
+    # same steps
+    assert sorted(x[0] for x in chain) == pytest.approx(list(parameters.steps()))
@@ -6,7 +6,7 @@ import zipfile
 
 from ec_interface.scripts import INPUT_NAME
 from ec_interface.vasp_results import VaspLocPot
-from ec_interface.ec_results import ECResults
+from ec_interface.ec_results import ECResults, FEESurrogate
 from ec_interface.ec_parameters import ECParameters
 
 from tests import DUMMY_EC_INPUT
@@ -95,3 +95,92 @@ def test_compute_fee():
 
     assert capacitance_hbm_vac == pytest.approx(0.09, abs=0.01)
     assert capacitance_hbm_vac != pytest.approx(capacitance_hbm_fermi, abs=0.001)
+
+
+def test_fee_surrogate(tmp_path):
+    ec_results = ECResults.from_hdf5(21, pathlib.Path(pathlib.Path(__file__).parent / 'ec_results.h5'))
+    data_hbm_fermi = ec_results.compute_fee_hbm_fermi()
+
+    surrogate = FEESurrogate.from_fee(data_hbm_fermi, order=3)
+    assert surrogate.order == 3
+
+    # reproduce the data
+    assert numpy.allclose(surrogate(data_hbm_fermi[:, 1]), data_hbm_fermi[:, 3], atol=1e-4)
+
+    # first derivative matches finite differences
+    assert numpy.allclose(
+        surrogate.derivative(data_hbm_fermi[1:-1, 1]),
+        numpy.gradient(data_hbm_fermi[:, 3], data_hbm_fermi[:, 1])[1:-1],
+        atol=1e-3
+    )
+
+    # capacitance is similar to the one of a quadratic fit
+    capacitance = -numpy.polyfit(data_hbm_fermi[:, 1], data_hbm_fermi[:, 3], 2)[0] * 2
+    assert FEESurrogate.from_fee(data_hbm_fermi).capacitance(numpy.linspace(1, 4, 100)) == pytest.approx(capacitance)
+
+    # save and load
+    path = tmp_path / 'results.h5'
+    ec_results.to_hdf5(path)
+    surrogate.to_hdf5(path, 'hbm_fermi')
+
+    surrogate_loaded = FEESurrogate.from_hdf5(path, 'hbm_fermi')
+    potentials = numpy.linspace(2, 3, 1000)
+    assert numpy.allclose(surrogate_loaded(potentials), surrogate(potentials))
+    assert numpy.allclose(surrogate_loaded.capacitance(potentials), surrogate.capacitance(potentials))
+
+    assert len(ECResults.from_hdf5(21, path)) == len(ec_results)  # results are not affected
+
+
+def test_zero_charge_lookup():
+    ec_results = ECResults.from_hdf5(21, pathlib.Path(pathlib.Path(__file__).parent / 'ec_results.h5'))
+    fee = ec_results.compute_fee_hbm(alpha=0.334, shift_with_avg=True)
+
+    # shuffled data, with a bit of noise on NELECT
+    data = ec_results.data[numpy.random.default_rng(42).permutation(len(ec_results))]
+    data[:, 0] += 1e-5
+    ec_results_noisy = ECResults(21, data)
+
+    assert numpy.all(numpy.diff(ec_results_noisy.nelects) > 0)
+    assert ec_results_noisy.index_zc == ec_results.index_zc == 5
+    assert ec_results_noisy.index_of(21.04) == 8
+
+    with pytest.raises(ValueError):
+        ec_results_noisy.index_of(21.05)
+
+    assert numpy.allclose(ec_results_noisy.compute_fee_hbm(alpha=0.334, shift_with_avg=True), fee, atol=1e-4)
+    assert ec_results_noisy.estimate_active_fraction(shift_with_avg=True) == pytest.approx(
+        ec_results.estimate_active_fraction(shift_with_avg=True), abs=1e-3)
+
+
+def test_ec_results_mapped(tmp_path):
+    path = pathlib.Path(pathlib.Path(__file__).parent / 'ec_results.h5')
+    ec_results = ECResults.from_hdf5(21, path)
+
+    assert not hasattr(ec_results, '__dict__')
+    assert isinstance(ec_results.data, numpy.memmap)
+    assert numpy.shares_memory(ec_results.nelects, ec_results.data)
+
+    # same data
+    ec_results_read = ECResults.from_hdf5(21, path, mmap=False)
+    assert not isinstance(ec_results_read.data, numpy.memmap)
+    assert numpy.array_equal(ec_results.data, ec_results_read.data)
+
+    # derived data are cached, but updated if NZC changes
+    assert ec_results.work_functions is ec_results.work_functions
+    assert ec_results.dnelects[ec_results.index_zc] == .0
+
+    ec_results.ne_zc = 21.04
+    assert ec_results.dnelects[ec_results.index_zc] == pytest.approx(.0)
+    assert ec_results.index_zc == 8
+
+    # overwrite the file that is mapped
+    path_copy = tmp_path / 'results.h5'
+    ECResults.from_hdf5(21, path, mmap=False).to_hdf5(path_copy)
+
+    ec_results_copy = ECResults.from_hdf5(21, path_copy)
+    ec_results_copy.to_hdf5(path_copy)
+    assert numpy.array_equal(ECResults.from_hdf5(21, path_copy).data, ec_results_read.data)
+
+    # ... and the mapped data remain valid
+    assert numpy.array_equal(ec_results_copy.data, ec_results_read.data)
+    assert list(tmp_path.iterdir()) == [path_copy]
@@ -0,0 +1,88 @@
+import pathlib
+
+import numpy
+import pytest
+
+from ec_interface.ec_results import ECResults
+from ec_interface.ec_results_collection import ECResultsCollection
+
+
+@pytest.fixture
+def collection():
+    ec_results = ECResults.from_hdf5(21, pathlib.Path(pathlib.Path(__file__).parent / 'ec_results.h5'))
+
+    # make two other systems out of the first: one with less points and shuffled, and one with another NZC
+    shuffle = numpy.random.default_rng(42).permutation(len(ec_results) - 4) + 2
+    other_nzc = ec_results.data.copy()
+    other_nzc[:, 0] += 3
+
+    return ECResultsCollection.from_results({
+        'sys1': ec_results,
+        'sys2': ECResults(21, ec_results.data[shuffle]),
+        'sys3': ECResults(24, other_nzc),
+    })
+
+
+def test_collection_pack(collection):
+    assert len(collection) == 3
+    assert collection.data.shape == (3, 13, 5)
+    assert numpy.array_equal(collection.mask.sum(axis=1), [13, 9, 13])
+    assert numpy.all(numpy.isnan(collection.nelects[1, 9:]))
+
+    # sorted
+    assert numpy.all(numpy.diff(collection.nelects[1, :9]) > 0)
+
+    # get back
+    assert numpy.allclose(collection['sys2'].data, collection.data[1, :9])
+
+
+def test_collection_analysis(collection):
+    pzcs = collection.pzcs()
+    assert pzcs[0] == pytest.approx(pzcs[1])
+    assert pzcs[0] == pytest.approx(pzcs[2])
+
+    fractions = collection.estimate_active_fractions()
+    alphas = numpy.array([.334, .4, .5])
+
+    for i, name in enumerate(collection.names):
+        ec_results = collection[name]
+        assert fractions[i] == pytest.approx(ec_results.estimate_active_fraction())
+
+        # FEE and capacitances
+        for fee, fee_ref in [
+            (collection.compute_fee_pbm(shift_with_avg=True), ec_results.compute_fee_pbm(shift_with_avg=True)),
+            (collection.compute_fee_hbm(alphas), ec_results.compute_fee_hbm(alphas[i])),
+            (
+                collection.compute_fee_hbm(alphas, shift_with_avg=True),
+                ec_results.compute_fee_hbm(alphas[i], shift_with_avg=True)
+            ),
+            (collection.compute_fee_hbm_fermi(), ec_results.compute_fee_hbm_fermi()),
+        ]:
+            n = len(ec_results)
+            assert numpy.allclose(fee[i, :n], fee_ref)
+            assert collection.capacitances(fee)[i] == pytest.approx(
+                -numpy.polyfit(fee_ref[:, 1], fee_ref[:, 3], 2)[0] * 2)
+
+
+def test_collection_polyfit(collection):
+    # abscissae far from zero, as work functions are
+    rng = numpy.random.default_rng(42)
+    x = collection.work_functions() + 100
+    y = 2 * (x - 100) ** 2 - (x - 100) + 3 + rng.normal(scale=.01, size=x.shape)
+
+    coefficients = collection.polyfit(x, y, 2)
+
+    for i in range(len(collection)):
+        mask = collection.mask[i]
+        assert coefficients[i] == pytest.approx(numpy.polyfit(x[i, mask], y[i, mask], 2), rel=1e-9)
+
+
+def test_collection_hdf5(collection, tmp_path):
+    path = tmp_path / 'collection.h5'
+    collection.to_hdf5(path)
+
+    loaded = ECResultsCollection.from_hdf5(path)
+    assert loaded.names == collection.names
+    assert numpy.allclose(loaded.ne_zcs, collection.ne_zcs)
+    assert numpy.array_equal(loaded.mask, collection.mask)
+    assert numpy.allclose(loaded.data[loaded.mask], collection.data[collection.mask])
@@ -0,0 +1,78 @@
+import pathlib
+
+import h5py
+import numpy
+import pytest
+
+from ec_interface.ec_parameters import ECParameters
+from ec_interface.finite_differences import fornberg_weights
+from ec_interface.scripts.fukui_series import compute_fukui_series
+from ec_interface.vasp_results import VaspResultGrid
+
+from tests.test_vasp_results import make_grid
+
+
+def test_fornberg_weights():
+    assert fornberg_weights(.0, numpy.array([-1., 0, 1])) == pytest.approx([-.5, 0, .5])
+    assert fornberg_weights(.0, numpy.array([-2., -1, 0, 1, 2])) == pytest.approx([1 / 12, -2 / 3, 0, 2 / 3, -1 / 12])
+    assert fornberg_weights(.0, numpy.array([0., 1, 2])) == pytest.approx([-1.5, 2, -.5])
+
+
+@pytest.mark.parametrize('half_width', [1, 2])
+def test_fukui_series(tmp_path, monkeypatch, half_width):
+    monkeypatch.chdir(tmp_path)
+
+    parameters = ECParameters(21., .02, .02, step=.01, additional=[21.005])
+    grid = make_grid((3, 4, 5))
+
+    # density is quadratic in N, so that the derivative is exact
+    def density(n):
+        return grid.grid_data * (1 + (n - 21) + (n - 21) ** 2)
+
+    for n, directory in zip(parameters.steps(), parameters.directories(pathlib.Path('.'))):
+        directory.mkdir()
+        with (directory / 'CHGCAR').open('w') as f:
+            VaspResultGrid(grid.geometry, density(n)).to_file(f)
+
+    nelects = list(parameters.steps())
+
+    compute_fukui_series(parameters, pathlib.Path('fukui.h5'), half_width=half_width)
+    with h5py.File('fukui.h5') as f:
+        assert f['nelects'][:] == pytest.approx(nelects)
+        assert f['fukui'].shape == (len(nelects), 3, 4, 5)
+
+        for i, n in enumerate(nelects):
+            assert numpy.allclose(f['fukui'][i], grid.grid_data * (1 + 2 * (n - 21)))
+
+    compute_fukui_series(parameters, pathlib.Path('fukui_planar.h5'), half_width=half_width, planar=True)
+    with h5py.File('fukui_planar.h5') as f:
+        assert f['fukui'].shape == (len(nelects), 5)
+        assert numpy.allclose(
+            f['fukui'][0], VaspResultGrid(grid.geometry, grid.grid_data * .96).xy_planar_average().values)
+
+
+def test_fukui_series_resample(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    parameters = ECParameters(21., .01, .01, step=.01)
+    grid = make_grid((4, 4, 6))
+    directories = list(parameters.directories(pathlib.Path('.')))
+
+    # a different mesh is resampled...
+    for directory, grid_size in zip(directories, [(4, 4, 6), (4, 4, 8), (4, 4, 6)]):
+        directory.mkdir()
+        with (directory / 'CHGCAR').open('w') as f:
+            VaspResultGrid(grid.geometry, numpy.ones(grid_size)).to_file(f)
+
+    compute_fukui_series(parameters, pathlib.Path('fukui.h5'))
+    with h5py.File('fukui.h5') as f:
+        assert numpy.allclose(f['fukui'][:], .0)
+
+    # ... but not a different cell
+    geometry = make_grid((1, 1, 1)).geometry
+    geometry.lattice_vectors = geometry.lattice_vectors * [1, 1, 1.5]
+    with (directories[1] / 'CHGCAR').open('w') as f:
+        VaspResultGrid(geometry, numpy.ones((4, 4, 8))).to_file(f)
+
+    with pytest.raises(ValueError):
+        compute_fukui_series(parameters, pathlib.Path('fukui.h5'))
@@ -5,8 +5,8 @@ import numpy
 import pytest
 import pathlib
 
-from ec_interface.vasp_geometry import Geometry, get_zvals
-from ec_interface.molecular_geometry import MolecularGeometry
+from ec_interface.vasp_geometry import Geometry, get_zvals, OverlapError
+from ec_interface.molecular_geometry import MolecularGeometry, XYZTrajectory
 from tests import DUMMY_POSCAR, DUMMY_POTCAR
 
 
@@ -22,6 +22,39 @@ def test_open_geometry():
     assert geometry._cartesian_coordinates.shape == (7, 3)
 
 
+def test_poscar_format():
+    geometry = Geometry(
+        'test',
+        numpy.diag([3., 3., 5.]),
+        ['C', 'H'],
+        [1, 2],
+        numpy.array([[.5, .25, 0.], [.75, -.5, .25], [.5, .75, .5]]),
+        selective_dynamics=numpy.array([[True, True, False], [True, True, True], [False, False, False]])
+    )
+
+    poscar = geometry.as_poscar()
+    assert poscar == """test
+1.0
+  3.000000000000   0.000000000000   0.000000000000
+  0.000000000000   3.000000000000   0.000000000000
+  0.000000000000   0.000000000000   5.000000000000
+C H
+1 2
+Selective dynamics
+Direct
+  0.500000000000   0.250000000000   0.000000000000 T T F C
+  0.750000000000  -0.500000000000   0.250000000000 T T T H
+  0.500000000000   0.750000000000   0.500000000000 F F F H
+"""
+
+    # read back
+    geometry_read = Geometry.from_poscar(StringIO(poscar))
+    assert geometry_read.ions == ['C', 'H', 'H']
+    assert numpy.allclose(geometry_read.direct_coordinates(), geometry.direct_coordinates())
+    assert numpy.array_equal(geometry_read.selective_dynamics, geometry.selective_dynamics)
+    assert geometry_read.as_poscar() == poscar
+
+
 def test_direct_to_cartesian():
     cell = numpy.array([
         [3., 0., 0.],
@@ -64,6 +97,157 @@ def test_change_vacuum():
     assert new_geometry.interslab_distance() == pytest.approx(20.)  # distance did!
 
 
+def test_change_vacuum_series():
+    f = StringIO()
+    f.write(DUMMY_POSCAR)
+    f.seek(0)
+
+    geometry = Geometry.from_poscar(f)
+
+    distances = [10., 15., 20.]
+    for direct in [True, False]:
+        new_geometries = geometry.change_interslab_distances(distances, direct=direct)
+        assert len(new_geometries) == len(distances)
+
+        for d, new_geometry in zip(distances, new_geometries):
+            reference = geometry.change_interslab_distance(d)
+            assert new_geometry.interslab_distance() == pytest.approx(d)
+            assert numpy.allclose(new_geometry.lattice_vectors, reference.lattice_vectors)
+            assert numpy.allclose(new_geometry.cartesian_coordinates(), reference.cartesian_coordinates())
+
+
+def test_make_supercell():
+    f = StringIO()
+    f.write(DUMMY_POSCAR)
+    f.seek(0)
+
+    poscar = Geometry.from_poscar(f)
+    geometry = Geometry(
+        poscar.title,
+        poscar.lattice_vectors,
+        ['Li', 'Na'],
+        [3, 4],
+        poscar.direct_coordinates(),
+        selective_dynamics=poscar.selective_dynamics
+    )
+
+    for matrix in [[3, 2, 1], [[1, 1, 0], [-1, 1, 0], [0, 0, 1]]]:
+        supercell = geometry.make_supercell(matrix)
+        num_images = int(round(abs(numpy.linalg.det(numpy.diag(matrix) if numpy.ndim(matrix) == 1 else matrix))))
+
+        assert len(supercell) == len(geometry) * num_images
+        assert supercell.ion_numbers == [3 * num_images, 4 * num_images]
+        assert numpy.isclose(abs(numpy.linalg.det(supercell.lattice_vectors)),
+                             abs(numpy.linalg.det(geometry.lattice_vectors)) * num_images)
+
+        # selective dynamics follow
+        assert numpy.array_equal(
+            supercell.selective_dynamics, numpy.repeat(geometry.selective_dynamics, num_images, axis=0))
+
+        # no atom is duplicated, and each of them is an image of an atom of the original cell
+        assert len(supercell.close_contacts(.1)[0]) == 0
+
+        direct = numpy.linalg.solve(geometry.lattice_vectors.T, supercell.cartesian_coordinates().T).T
+        original = numpy.repeat(geometry.direct_coordinates(), num_images, axis=0)
+        assert numpy.allclose(direct - numpy.round(direct - original), original)
+
+    for matrix in [[1, 0, 1], [[1, 0], [0, 1]], [[1, 0, 0], [0, 1, 0]], [1, 2]]:
+        with pytest.raises(ValueError):
+            geometry.make_supercell(matrix)
+
+
+def test_same_cell():
+    geometry = Geometry.from_poscar(StringIO(DUMMY_POSCAR))
+
+    assert geometry.same_cell(Geometry.from_poscar(StringIO(DUMMY_POSCAR)))
+    assert not geometry.same_cell(geometry.change_interslab_distance(10.))
+    assert geometry.same_cell(geometry.make_supercell(1))
+    assert not geometry.same_cell(geometry.make_supercell([1, 1, 2]))
+
+
+def test_layers():
+    f = StringIO()
+    f.write(DUMMY_POSCAR)
+    f.seek(0)
+
+    geometry = Geometry.from_poscar(f)
+    assert numpy.array_equal(geometry.layers(), numpy.arange(7))
+    assert numpy.all(geometry.layers(tolerance=2.) == 0)
+
+    # slab crossing the cell boundary
+    shifted = Geometry(
+        geometry.title,
+        geometry.lattice_vectors,
+        geometry.ion_types,
+        geometry.ion_numbers,
+        (geometry.direct_coordinates() + [.0, .0, .6]) % 1.
+    )
+
+    assert numpy.array_equal(shifted.layers(), numpy.arange(7))
+
+    # freeze bottom and top layers
+    frozen = shifted.freeze_layers([0, 1, -1])
+    assert numpy.array_equal(frozen.selective_dynamics.any(axis=1), [False, False, True, True, True, True, False])
+
+    # keep existing selective dynamics
+    frozen = geometry.freeze_layers([0])
+    assert numpy.array_equal(frozen.selective_dynamics.any(axis=1), [False, True, True, False, True, True, True])
+
+    # rotated cell: heights are along the normal to the slab
+    c, s = numpy.cos(numpy.pi / 6), numpy.sin(numpy.pi / 6)
+    rotation = numpy.array([[1, 0, 0], [0, c, -s], [0, s, c]])
+    rotated = Geometry(
+        geometry.title,
+        geometry.lattice_vectors @ rotation.T,
+        geometry.ion_types,
+        geometry.ion_numbers,
+        geometry.direct_coordinates()
+    )
+
+    assert rotated.cell_height() == pytest.approx(geometry.lattice_vectors[2, 2])
+    assert rotated.lattice_vectors[2, 2] != pytest.approx(geometry.lattice_vectors[2, 2])
+    assert numpy.array_equal(rotated.layers(), geometry.layers())
+
+    # layers that do not exist
+    for layers in [[7], [-8], list(range(10))]:
+        with pytest.raises(ValueError):
+            geometry.freeze_layers(layers)
+
+
+def test_lazy_coordinates():
+    f = StringIO()
+    f.write(DUMMY_POSCAR)
+    f.seek(0)
+
+    geometry = Geometry.from_poscar(f)
+
+    assert not hasattr(geometry, '__dict__')
+    assert geometry.species.tolist() == [0] * 7
+    assert geometry.ions == ['Li'] * 7
+    assert geometry.species is geometry.species
+
+    # species follow the ion numbers
+    geometry.ion_types = ['Li', 'Na']
+    geometry.ion_numbers = [3, 4]
+    assert geometry.species.tolist() == [0] * 3 + [1] * 4
+    assert geometry.ions == ['Li'] * 3 + ['Na'] * 4
+
+    # cartesian coordinates are only computed once
+    assert geometry._cartesian is None
+    cartesian_coordinates = geometry.cartesian_coordinates()
+    assert geometry.cartesian_coordinates() is cartesian_coordinates
+
+    # changing the vacuum does not affect the original geometry
+    geometry.change_interslab_distance(20.)
+    assert numpy.array_equal(geometry.cartesian_coordinates(), cartesian_coordinates)
+    assert geometry.cartesian_coordinates()[:, 2].min() > 5.
+
+    # direct coordinates are recovered from cartesian ones
+    geometry_cartesian = Geometry(
+        'test', geometry.lattice_vectors, geometry.ion_types, geometry.ion_numbers, cartesian_coordinates, False)
+    assert numpy.allclose(geometry_cartesian.direct_coordinates(), geometry.direct_coordinates())
+
+
 def test_nelect():
     f = StringIO()
     f.write(DUMMY_POSCAR)
@@ -122,6 +306,21 @@ def test_read_molecular_geometry():
     assert numpy.allclose(molecular_geometry.positions, [[.7, .7, .0], [.0, .0, .0], [0.7, -.7, .0]])
 
 
+def test_read_trajectory():
+    frames = ''.join('3\nframe {}\nH {} 0.7 0.0\nO 0.0 0.0 0.0\nH 0.7 -0.7 0.0\n'.format(i, i) for i in range(10))
+    trajectory = XYZTrajectory(io.BytesIO(frames.encode()))
+
+    assert len(trajectory) == 10
+    assert trajectory[-1].positions[0, 0] == 9.
+    assert list(trajectory.indices(slice(2, 8, 3))) == [2, 5]
+
+    selected = list(trajectory.frames(slice(2, 8, 3)))
+    assert len(selected) == 2
+    for i, geometry in zip([2, 5], selected):
+        assert geometry.symbols == ['H', 'O', 'H']
+        assert numpy.allclose(geometry.positions, [[i, .7, .0], [.0, .0, .0], [0.7, -.7, .0]])
+
+
 def test_convert_molecular_geometry():
 
     lattice = numpy.array([
@@ -204,3 +403,67 @@ def test_merge():
     assert numpy.allclose(new_geometry._cartesian_coordinates[len(geometry):], additional._cartesian_coordinates)
 
     assert numpy.array_equal(new_geometry.selective_dynamics[:len(geometry)], geometry.selective_dynamics)
+
+
+def test_merge_overlap():
+    f = StringIO()
+    f.write(DUMMY_POSCAR)
+    f.seek(0)
+
+    geometry = Geometry.from_poscar(f)
+
+    # Li-Li distance in the slab
+    i, j, d = geometry.close_contacts(3.1)
+    assert len(d) == 24  # 6 pairs of neighbouring layers, 4 neighbours in the other layer (with periodic images)
+    assert numpy.all(d < 3.1)
+
+    lattice = numpy.diag([5., 5., 5.])
+    f = StringIO()
+    f.write(GEOMETRY)
+    f.seek(0)
+    additional = MolecularGeometry.from_xyz(f).to_vasp(lattice_vectors=lattice)
+
+    # water on top of the first Li atom
+    shift = geometry.cartesian_coordinates()[0] + [.0, .0, .5]
+    with pytest.raises(OverlapError) as e:
+        geometry.merge_with(additional, shift=shift, min_distance=1.5)
+
+    assert sorted(e.value.i.tolist()) == [0, 1, 2]
+    assert e.value.j.tolist() == [0, 0, 0]
+    assert sorted(e.value.distances) == pytest.approx([.5, numpy.sqrt(.98 + .25), numpy.sqrt(.98 + .25)])
+
+    # ... but not if it is further
+    shift = geometry.cartesian_coordinates()[0] - [.0, .0, 2.]
+    new_geometry = geometry.merge_with(additional, shift=shift, min_distance=1.5)
+    assert len(new_geometry) == len(geometry) + len(additional)
+
+
+def test_merge_many():
+    f = StringIO()
+    f.write(DUMMY_POSCAR)
+    f.seek(0)
+
+    geometry = Geometry.from_poscar(f)
+
+    lattice = numpy.diag([5., 5., 5.])
+    f = StringIO()
+    f.write(GEOMETRY)
+    f.seek(0)
+    additional = MolecularGeometry.from_xyz(f).to_vasp(lattice_vectors=lattice)
+
+    top = geometry.cartesian_coordinates()[0]
+    shifts = numpy.array([top + [.0, .0, .5], top - [.0, .0, 2.], [.0, .0, 1.]])
+
+    new_geometries, kept = geometry.merge_with_many(additional, shifts)
+    assert kept.tolist() == [0, 1, 2]
+
+    for shift, new_geometry in zip(shifts, new_geometries):
+        assert numpy.allclose(
+            new_geometry.cartesian_coordinates(), geometry.merge_with(additional, shift=shift).cartesian_coordinates())
+
+    # first placement is discarded
+    new_geometries, kept = geometry.merge_with_many(additional, shifts, min_distance=1.5)
+    assert kept.tolist() == [1, 2]
+    assert len(new_geometries) == 2
+    assert numpy.allclose(new_geometries[0].cartesian_coordinates()[len(geometry):],
+                          additional.cartesian_coordinates() + shifts[1])
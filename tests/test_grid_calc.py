@@ -0,0 +1,71 @@
+import h5py
+import numpy
+import pytest
+
+from ec_interface.grid_calc import parse_expression, ExpressionError
+from ec_interface.scripts.grid_calc import grid_calc
+from ec_interface.vasp_results import VaspResultGrid
+
+from tests.test_vasp_results import make_grid
+
+
+def test_parse_expression():
+    assert parse_expression('a - b - c') == ({'a': 1., 'b': -1., 'c': -1.}, .0)
+    assert parse_expression('(a - b) / 0.5 + 2 * c - 1') == ({'a': 2., 'b': -2., 'c': 2.}, -1.)
+    assert parse_expression('-(a - 2 * a) * 3') == ({'a': 3.}, .0)
+
+    for expression in ['a * b', '1 / a', 'a ** 2', 'f(a)', 'a -', 'a / 0']:
+        with pytest.raises(ExpressionError):
+            parse_expression(expression)
+
+
+def test_grid_calc(tmp_path):
+    grids = {}
+    for i, name in enumerate(['a', 'b', 'c']):
+        grids[name] = make_grid((3, 5, 7))
+        grids[name].grid_data *= i + 1
+        with (tmp_path / name).open('w') as f:
+            grids[name].to_file(f)
+
+    operands = dict((name, tmp_path / name) for name in grids)
+    expected = grids['a'].grid_data - grids['b'].grid_data - .5 * grids['c'].grid_data
+
+    # to CHGCAR
+    grid_calc('a - b - c / 2', operands, str(tmp_path / 'out'), num_planes=2)
+    with (tmp_path / 'out').open() as f:
+        assert numpy.allclose(VaspResultGrid.from_file(f).grid_data, expected)
+
+    # to HDF5
+    grid_calc('a - b - c / 2', operands, str(tmp_path / 'out.h5'))
+    with h5py.File(tmp_path / 'out.h5') as f:
+        assert numpy.allclose(f['grid'][:], expected)
+
+    grid_calc('a - b - c / 2', operands, str(tmp_path / 'out.hdf5'))
+    with h5py.File(tmp_path / 'out.hdf5') as f:
+        assert numpy.allclose(f['grid'][:], expected)
+
+    # ... or in a dataset, added to the file
+    grid_calc('a - b', operands, '{}:diff/ab'.format(tmp_path / 'out.h5'))
+    with h5py.File(tmp_path / 'out.h5') as f:
+        assert numpy.allclose(f['grid'][:], expected)
+        assert numpy.allclose(f['diff/ab'][:], grids['a'].grid_data - grids['b'].grid_data)
+
+    # grids with a different size are resampled
+    with (tmp_path / 'd').open('w') as f:
+        grids['b'].resample((6, 8, 10)).to_file(f)
+
+    grid_calc('a - d', dict(a=tmp_path / 'a', d=tmp_path / 'd'), str(tmp_path / 'out'))
+    with (tmp_path / 'out').open() as f:
+        assert numpy.allclose(VaspResultGrid.from_file(f).grid_data, grids['a'].grid_data - grids['b'].grid_data)
+
+    # ... but not if cells differ
+    other = make_grid((3, 5, 7))
+    other.geometry.lattice_vectors = other.geometry.lattice_vectors * 2
+    with (tmp_path / 'e').open('w') as f:
+        other.to_file(f)
+
+    with pytest.raises(ExpressionError):
+        grid_calc('a - e', dict(a=tmp_path / 'a', e=tmp_path / 'e'), str(tmp_path / 'out'))
+
+    with pytest.raises(ExpressionError):
+        grid_calc('a - f', operands, str(tmp_path / 'out'))
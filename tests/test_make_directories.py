@@ -4,7 +4,7 @@ import pytest
 
 from ec_interface.ec_parameters import ECParameters
 from ec_interface.scripts import INPUT_NAME
-from ec_interface.scripts.make_directories import create_input_directories
+from ec_interface.scripts.make_directories import create_input_directories, CHAIN_NAME, MANIFEST_NAME
 
 from tests import DUMMY_POSCAR, DUMMY_INCAR, DUMMY_KPOINTS, DUMMY_POTCAR, DUMMY_EC_INPUT
 
@@ -54,6 +54,99 @@ def test_create_directories_ok(basic_inputs):
             assert 'NELECT = {:.3f}'.format(nelect) in incar_content
 
 
+def test_create_directories_warm_start_ok(basic_inputs):
+    with pathlib.Path(INPUT_NAME).open() as f:
+        parameters = ECParameters.from_yaml(f)
+
+    create_input_directories(parameters, use_symlinks=True, warm_start=True)
+
+    with pathlib.Path(CHAIN_NAME).open() as f:
+        chain = [line.split() for line in f.readlines()]
+
+    assert len(chain) == 11
+    assert chain[0] == ['EC_21.000', '-']
+
+    for i, (directory, start_from) in enumerate(chain):
+        with (pathlib.Path(directory) / 'INCAR').open() as f:
+            incar_content = f.read()
+
+        if i == 0:
+            assert 'ISTART' not in incar_content
+        else:
+            assert 'ISTART = 1' in incar_content
+            assert start_from in [x[0] for x in chain[:i]]  # parent comes first
+            assert abs(float(start_from[3:]) - 21.) < abs(float(directory[3:]) - 21.)  # closer to NZC
+
+
+def test_create_directories_incremental_ok(basic_inputs):
+    with pathlib.Path(INPUT_NAME).open() as f:
+        parameters = ECParameters.from_yaml(f)
+
+    actions = create_input_directories(parameters, use_symlinks=True, force=False)
+    assert all(action == 'create' for _, action in actions)
+    assert pathlib.Path(MANIFEST_NAME).exists()
+
+    # put an output file
+    output = pathlib.Path('EC_21.000') / 'WAVECAR'
+    output.write_text('output')
+
+    # nothing to do
+    actions = create_input_directories(parameters, use_symlinks=True, force=False)
+    assert all(action == 'up-to-date' for _, action in actions)
+
+    # same without manifest
+    pathlib.Path(MANIFEST_NAME).unlink()
+    actions = create_input_directories(parameters, use_symlinks=True, force=False)
+    assert all(action == 'up-to-date' for _, action in actions)
+
+    # add points
+    parameters.ne_added = 0.07
+    actions = dict((d.name, action) for d, action in create_input_directories(
+        parameters, use_symlinks=True, force=False))
+    assert actions['EC_21.060'] == actions['EC_21.070'] == 'create'
+    assert sum(action == 'up-to-date' for action in actions.values()) == 11
+
+    # change INCAR: nothing happens during a dry run...
+    with pathlib.Path('INCAR').open('a') as f:
+        f.write('\nNBANDS = 40')
+
+    actions = create_input_directories(parameters, use_symlinks=True, force=False, dry_run=True)
+    assert all(action == 'update' for _, action in actions)
+    assert 'NBANDS = 40' not in (pathlib.Path('EC_21.000') / 'INCAR').read_text()
+
+    # ... but then, everything is updated, and outputs are kept
+    actions = create_input_directories(parameters, use_symlinks=True, force=False)
+    assert all(action == 'update' for _, action in actions)
+    assert 'NBANDS = 40' in (pathlib.Path('EC_21.000') / 'INCAR').read_text()
+    assert output.exists()
+
+    # force re-creation
+    actions = create_input_directories(parameters, use_symlinks=True, force=True)
+    assert all(action == 'recreate' for _, action in actions)
+    assert not output.exists()
+
+
+def test_create_directories_dry_run_without_manifest_ok(basic_inputs, capsys):
+    with pathlib.Path(INPUT_NAME).open() as f:
+        parameters = ECParameters.from_yaml(f)
+
+    create_input_directories(parameters, use_symlinks=True, force=False)
+    pathlib.Path(MANIFEST_NAME).unlink()
+
+    # only INCAR changes, so other inputs are not reported
+    with pathlib.Path('INCAR').open('a') as f:
+        f.write('\nNBANDS = 40')
+
+    capsys.readouterr()
+    actions = create_input_directories(parameters, use_symlinks=True, force=False, dry_run=True)
+    assert all(action == 'update' for _, action in actions)
+
+    out = capsys.readouterr().out
+    assert '+NBANDS = 40' in out
+    assert 'changed' not in out
+    assert not pathlib.Path(MANIFEST_NAME).exists()
+
+
 def test_create_directories_missing_files_ko(basic_inputs):
     with pathlib.Path(INPUT_NAME).open() as f:
         parameters = ECParameters.from_yaml(f)
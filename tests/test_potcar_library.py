@@ -0,0 +1,53 @@
+import io
+import os
+
+import pytest
+
+from ec_interface.potcar_library import PotcarLibrary
+from ec_interface.vasp_geometry import Geometry
+
+from tests import DUMMY_POSCAR, DUMMY_POTCAR
+
+
+@pytest.fixture
+def potpaw(tmp_path):
+    """Create a small library of pseudopotentials"""
+
+    for name, content in [('Li', DUMMY_POTCAR), ('Li_sv', DUMMY_POTCAR.replace('1.000', '3.000'))]:
+        (tmp_path / 'potpaw' / name).mkdir(parents=True)
+        with (tmp_path / 'potpaw' / name / 'POTCAR').open('w') as f:
+            f.write(content)
+
+    return tmp_path / 'potpaw'
+
+
+def test_potcar_library(potpaw, tmp_path):
+    geometry = Geometry.from_poscar(io.StringIO(DUMMY_POSCAR))
+    index_path = tmp_path / 'index.json'
+
+    library = PotcarLibrary(potpaw, index_path=index_path)
+    assert library.nelect(geometry) == 7.0
+    assert library.nelect(geometry, {'Li': 'Li_sv'}) == 21.0
+
+    with pytest.raises(KeyError):
+        library['X']
+
+    library.save()
+    assert index_path.exists()
+
+    # index is used, and only updated if the file changed
+    library = PotcarLibrary(potpaw, index_path=index_path)
+    assert len(library.entries) == 2
+    assert library['Li'] == library.entries['Li']
+
+    with (potpaw / 'Li' / 'POTCAR').open('w') as f:
+        f.write(DUMMY_POTCAR.replace('1.000', '2.000'))
+    os.utime(potpaw / 'Li' / 'POTCAR', (0, 0))
+
+    assert library.nelect(geometry) == 14.0
+    assert library['Li'].checksum != library.entries['Li_sv'].checksum
+
+    # POTCAR
+    f = io.BytesIO()
+    library.write_potcar(geometry, f, {'Li': 'Li_sv'})
+    assert f.getvalue() == (potpaw / 'Li_sv' / 'POTCAR').read_bytes()
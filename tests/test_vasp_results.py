@@ -0,0 +1,179 @@
+import io
+
+import numpy
+import pytest
+
+from ec_interface.vasp_geometry import Geometry
+from ec_interface.vasp_results import (
+    VaspResultGrid, PlanarAverage, read_grid_header, read_grid_blocks, write_grid_blocks
+)
+
+from tests import DUMMY_POSCAR
+
+
+def make_grid(shape) -> VaspResultGrid:
+    geometry = Geometry.from_poscar(io.StringIO(DUMMY_POSCAR))
+    return VaspResultGrid(geometry, numpy.random.default_rng(42).random(shape))
+
+
+def test_grid_file():
+    grid = make_grid((3, 4, 7))
+
+    f = io.StringIO()
+    grid.to_file(f)
+    content = f.getvalue()
+
+    grid_read = VaspResultGrid.from_file(io.StringIO(content))
+    assert numpy.allclose(grid_read.grid_data, grid.grid_data)
+    assert numpy.allclose(grid_read.geometry.lattice_vectors, grid.geometry.lattice_vectors)
+
+    # without the padding of the last line, as written by VASP
+    lines = content.splitlines()
+    lines[-1] = ' '.join(lines[-1].split()[:84 % 5])
+    grid_read = VaspResultGrid.from_file(io.StringIO('\n'.join(lines)))
+    assert numpy.allclose(grid_read.grid_data, grid.grid_data)
+
+
+def test_grid_blocks():
+    grid = make_grid((3, 4, 7))
+
+    f = io.StringIO()
+    grid.to_file(f)
+    content = f.getvalue()
+
+    for num_planes in [1, 2, 7, 10]:
+        f = io.StringIO(content)
+        geometry, grid_size = read_grid_header(f)
+        assert grid_size == (3, 4, 7)
+
+        blocks = list(read_grid_blocks(f, grid_size, num_planes))
+        assert len(blocks) == int(numpy.ceil(7 / num_planes))
+        assert numpy.allclose(numpy.concatenate(blocks, axis=2), grid.grid_data)
+
+        # writing by blocks is the same as writing everything at once
+        f = io.StringIO()
+        write_grid_blocks(f, geometry, grid_size, blocks)
+        assert f.getvalue() == content
+
+
+def test_resample():
+    grid = make_grid((12, 10, 9))
+
+    def f(x, y, z):
+        return 1 + numpy.cos(2 * numpy.pi * x) + numpy.sin(2 * numpy.pi * (y + 2 * z))
+
+    grid.grid_data = f(*numpy.meshgrid(*(numpy.arange(n) / n for n in grid.grid_data.shape), indexing='ij'))
+
+    for shape in [(16, 12, 20), (5, 5, 5), (12, 10, 9)]:
+        new_grid = grid.resample(shape)
+        assert new_grid.grid_data.shape == shape
+        assert numpy.allclose(
+            new_grid.grid_data, f(*numpy.meshgrid(*(numpy.arange(n) / n for n in shape), indexing='ij')))
+
+
+def test_macroscopic_average():
+    # two materials, with different periods
+    length = 20.
+    z = numpy.arange(400) / 400 * length
+    values = numpy.where(z < 10, 1 + numpy.cos(2 * numpy.pi * z / 2.), 3 + numpy.cos(2 * numpy.pi * z / 2.5))
+
+    planar_average = PlanarAverage(values, length)
+    assert numpy.allclose(planar_average.positions(), z)
+
+    average = planar_average.macroscopic_average(2.)
+    assert average.values[50] == pytest.approx(1., abs=1e-3)
+    assert average.values.mean() == pytest.approx(values.mean())
+
+    average = planar_average.macroscopic_average(2., 2.5)
+    assert average.values[50] == pytest.approx(1., abs=1e-3)
+    assert average.values[300] == pytest.approx(3., abs=1e-3)
+
+
+def test_miller_average():
+    grid = make_grid((8, 9, 10))
+
+    # lattice axes are the same as planar averages
+    for axis in range(3):
+        miller_indices = [0, 0, 0]
+        miller_indices[axis] = 1
+
+        planar_average = grid.planar_average(axis)
+        miller_average = grid.miller_average(miller_indices)
+        assert numpy.allclose(miller_average.values, planar_average.values)
+        assert miller_average.length == pytest.approx(planar_average.length)
+
+    # hexagonal cell, with a value that only depends on the position along the normal to the (110) planes
+    a, c = 3., 10.
+    grid.geometry.lattice_vectors = numpy.array([[a, 0, 0], [-a / 2, a * numpy.sqrt(3) / 2, 0], [0, 0, c]])
+    n = 12
+    i, j = numpy.meshgrid(numpy.arange(n), numpy.arange(n), indexing='ij')
+    grid.grid_data = numpy.repeat(numpy.cos(2 * numpy.pi * (i + j) / n)[:, :, numpy.newaxis], 4, axis=2)
+
+    miller_average = grid.miller_average((1, 1, 0))
+    assert miller_average.length == pytest.approx(a / 2)
+    assert numpy.allclose(miller_average.values, numpy.cos(2 * numpy.pi * numpy.arange(n) / n))
+
+    assert len(grid.miller_average((1, 1, 0), num_bins=4).values) == 4
+
+    with pytest.raises(ValueError):
+        grid.miller_average((0, 0, 0))
+
+
+def test_miller_average_common_factor():
+    # indices sharing a factor with the size of the grid
+    grid = make_grid((8, 9, 10))
+    i, j, _ = numpy.meshgrid(*(numpy.arange(n) for n in grid.grid_data.shape), indexing='ij')
+
+    grid.grid_data = numpy.cos(2 * numpy.pi * 2 * i / 8)
+    assert numpy.allclose(grid.miller_average((2, 0, 0)).values, [1, 0, -1, 0])
+
+    # positions along the normal are `36 * (2i/8 + 2j/9)`
+    grid.grid_data = numpy.cos(2 * numpy.pi * (2 * i / 8 + 2 * j / 9))
+    miller_average = grid.miller_average((2, 2, 0))
+    assert numpy.allclose(miller_average.values, numpy.cos(2 * numpy.pi * numpy.arange(36) / 36))
+
+    grid.grid_data = numpy.cos(2 * numpy.pi * 3 * j / 9)
+    assert numpy.allclose(grid.miller_average((0, 3, 0)).values, numpy.cos(2 * numpy.pi * numpy.arange(3) / 3))
+
+    # more bins than distinct positions
+    with pytest.raises(ValueError):
+        grid.miller_average((0, 3, 0), num_bins=4)
+
+
+def test_regions():
+    values = numpy.array([.5, .1, .2, .6, .7, .05, .3])
+    planar_average = PlanarAverage(values, 7.)
+
+    threshold_index, starts, ends, sums = planar_average.regions([.4, .15, 1.])
+
+    assert numpy.array_equal(threshold_index, [0, 0, 0, 0, 1, 1, 1, 1, 1, 2])
+    assert numpy.array_equal(starts, [0, 1, 3, 5, 0, 1, 2, 5, 6, 0])
+    assert numpy.array_equal(ends, [1, 3, 5, 7, 1, 2, 5, 6, 7, 7])
+    assert numpy.allclose(sums, [values[s:e].sum() for s, e in zip(starts, ends)])
+
+
+def test_read_header():
+    grid = make_grid((3, 4, 7))
+
+    f = io.StringIO()
+    grid.to_file(f)
+    content = f.getvalue()
+
+    info = VaspResultGrid.read_header(io.StringIO(content))
+    assert info.grid_size == (3, 4, 7)
+    assert numpy.allclose(info.geometry.lattice_vectors, grid.geometry.lattice_vectors)
+    assert numpy.allclose(info.spacing(), numpy.linalg.norm(grid.geometry.lattice_vectors, axis=1) / [3, 4, 7])
+
+    # values start at `data_offset`
+    f = io.StringIO(content)
+    f.seek(info.data_offset)
+    assert numpy.allclose(next(read_grid_blocks(f, info.grid_size, num_planes=7)), grid.grid_data)
+
+    # values are not read
+    info_truncated = VaspResultGrid.read_header(io.StringIO(content[:info.data_offset] + 'not a value'))
+    assert info_truncated.grid_size == info.grid_size
+    assert info_truncated.data_offset == info.data_offset
+
+    # not a grid
+    info = VaspResultGrid.read_header(io.StringIO(DUMMY_POSCAR))
+    assert info.grid_size is None